@@ -1,15 +1,79 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
+from contextlib import asynccontextmanager
+from typing import List
+from datetime import datetime, timezone
+import asyncio
 import json
-import os
-from services.staging import check_staging_alive
-from services.posthog import get_active_users
-from services.jira import get_open_p1_bugs, get_open_bugs_by_priority, get_open_all_bugs
-from services.uptime_robot import get_product_uptime, get_product_response_times, get_all_products_data
-from services.security import check_product_security
+import time
+from services.uptime_robot import clear_uptime_cache
+from services.jira import iter_bug_tasks_by_project, run_jira_sync, JIRA_SYNC_ENABLED
+from services.collector import collect_product_sources, start_portfolio_sweeps, stop_portfolio_sweeps
+from services.probe import get_staging_url, PROBE_METHODS
+from services.response_history import get_response_time_window_stats
+from services.concurrency import (
+    as_completed_limited,
+    evaluation_deadline,
+    gather_limited,
+    MAX_CONCURRENT_PRODUCTS
+)
+from services.http_client import start_http_client, close_http_client
+from services.circuit_breaker import get_circuit_states
+from services.snapshots import (
+    discard_snapshot_product,
+    get_snapshot_product,
+    refresh_snapshot,
+    run_snapshot_scheduler,
+    store_evaluation,
+    SNAPSHOT_ENABLED
+)
+from services.http_caching import cached_json_response, combined_hash, content_hash
+from services.registry import (
+    create_product as create_product_record,
+    delete_product as delete_product_record,
+    flush_stage_updates,
+    get_product,
+    get_stage,
+    list_product_ids,
+    list_products as list_product_records,
+    run_registry_flusher,
+    update_stage_fields,
+    update_stage_fields_bulk
+)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # One pooled HTTP client shared by every service module
+    await start_http_client()
+
+    # Keep a local store of Jira bugs so bug counts are answered from memory
+    jira_sync = None
+    if JIRA_SYNC_ENABLED:
+        jira_sync = asyncio.create_task(
+            run_jira_sync(get_jira_project_keys)
+        )
+
+    # Write journaled stage and observation updates to the registry in batches
+    registry_flusher = asyncio.create_task(run_registry_flusher())
+
+    # Recompute all evaluations in the background so reads never wait on upstreams
+    snapshot_scheduler = None
+    if SNAPSHOT_ENABLED:
+        snapshot_scheduler = asyncio.create_task(run_snapshot_scheduler(evaluate_all_products))
 
-app = FastAPI()
+    yield
+
+    if snapshot_scheduler:
+        snapshot_scheduler.cancel()
+    if jira_sync:
+        jira_sync.cancel()
+    registry_flusher.cancel()
+    await flush_stage_updates()
+    await close_http_client()
+
+app = FastAPI(lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -25,56 +89,37 @@ class StageUpdate(BaseModel):
 class ObservationsUpdate(BaseModel):
     observations: str
 
+class BulkStageItem(BaseModel):
+    product_id: str
+    stage: str = None
+    observations: str = None
+
+class BulkStageUpdate(BaseModel):
+    updates: List[BulkStageItem]
+
 class ProductCreate(BaseModel):
     id: str
     name: str
     description: str = None
+    probe_method: str = None
 
-STAGES_FILE = "product_stages.json"
-PRODUCTS_FILE = "products.json"
-
-def load_stages():
-    if os.path.exists(STAGES_FILE):
-        with open(STAGES_FILE, 'r') as f:
-            data = json.load(f)
-            # Handle backward compatibility - convert old format to new format
-            if data and isinstance(list(data.values())[0], str):
-                # Old format: {"product": "stage"}
-                # Convert to new format: {"product": {"stage": "stage"}}
-                converted_data = {}
-                for product_id, stage in data.items():
-                    converted_data[product_id] = {"stage": stage}
-                save_stages(converted_data)  # Save in new format
-                return converted_data
-            return data
-    return {}
-
-def save_stages(stages):
-    with open(STAGES_FILE, 'w') as f:
-        json.dump(stages, f, indent=2)
-
-def load_products():
-    if os.path.exists(PRODUCTS_FILE):
-        with open(PRODUCTS_FILE, 'r') as f:
-            return json.load(f)
-    # Default products if file doesn't exist
-    default_products = {
-        "chorus": {"name": "Chorus", "description": "Main product"},
-        "cadence": {"name": "Cadence", "description": "Cadence product"},
-        "kenna": {"name": "Kenna", "description": "Kenna product"},
-        "duet": {"name": "Duet", "description": "Duet product"},
-        "nest": {"name": "Nest", "description": "Nest product"}
-    }
-    save_products(default_products)
-    return default_products
+async def get_valid_product_ids():
+    return await list_product_ids()
 
-def save_products(products):
-    with open(PRODUCTS_FILE, 'w') as f:
-        json.dump(products, f, indent=2)
+async def get_jira_project_keys():
+    return [product_id.upper() for product_id in await get_valid_product_ids()]
 
-def get_valid_product_ids():
-    products = load_products()
-    return list(products.keys())
+async def get_registry_fields(product_id: str):
+    """Name, description, stage and observations of a product from the registry"""
+    product_info, product_data = await asyncio.gather(get_product(product_id), get_stage(product_id))
+    product_info = product_info or {}
+    
+    return {
+        "name": product_info.get("name", product_id),
+        "description": product_info.get("description"),
+        "stage": product_data.get("stage"),
+        "observations": product_data.get("observations")
+    }
 
 @app.get("/")
 @app.head("/")
@@ -84,14 +129,12 @@ async def root():
 @app.get("/products")
 async def list_products():
     """List all available products"""
-    products = load_products()
+    products = await list_product_records()
     return {"products": products}
 
 @app.post("/products")
 async def create_product(product: ProductCreate):
     """Create a new product"""
-    products = load_products()
-    
     # Validate product ID format (alphanumeric, lowercase, no spaces)
     if not product.id.isalnum() or not product.id.islower():
         raise HTTPException(
@@ -99,40 +142,38 @@ async def create_product(product: ProductCreate):
             detail="Product ID must be alphanumeric and lowercase"
         )
     
-    # Check if product already exists
-    if product.id in products:
-        raise HTTPException(status_code=409, detail="Product already exists")
+    # Validate staging probe method, if given
+    if product.probe_method and product.probe_method.upper() not in PROBE_METHODS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"probe_method must be one of {', '.join(PROBE_METHODS)}"
+        )
     
-    # Add new product
-    products[product.id] = {
+    # Add new product, unless it already exists
+    new_product = {
         "name": product.name,
         "description": product.description
     }
-    save_products(products)
+    if product.probe_method:
+        new_product["probe_method"] = product.probe_method.upper()
+    if not await create_product_record(product.id, new_product):
+        raise HTTPException(status_code=409, detail="Product already exists")
     
     return {
         "success": True,
-        "product": products[product.id],
+        "product": new_product,
         "message": f"Product '{product.id}' created successfully"
     }
 
 @app.delete("/products/{product_id}")
 async def delete_product(product_id: str):
     """Delete a product"""
-    products = load_products()
-    
-    if product_id not in products:
+    # Remove the product and its stage in one transaction
+    deleted_product = await delete_product_record(product_id)
+    if deleted_product is None:
         raise HTTPException(status_code=404, detail="Product not found")
     
-    # Remove from products
-    deleted_product = products.pop(product_id)
-    save_products(products)
-    
-    # Also remove from stages if exists
-    stages = load_stages()
-    if product_id in stages:
-        stages.pop(product_id)
-        save_stages(stages)
+    discard_snapshot_product(product_id)
     
     return {
         "success": True,
@@ -140,37 +181,189 @@ async def delete_product(product_id: str):
         "message": f"Product '{product_id}' deleted successfully"
     }
 
+async def evaluate_all_products():
+    # One deadline for the portfolio sweeps and every product's sources
+    deadline = evaluation_deadline()
+    product_ids = await get_valid_product_ids()
+    sweeps = start_portfolio_sweeps(product_ids)
+    
+    # Evaluate products concurrently, each waiting on its share of the sweeps;
+    # results keep the registry order
+    try:
+        return await gather_limited(
+            (evaluate_single_product(product_id, sweeps, deadline) for product_id in product_ids),
+            MAX_CONCURRENT_PRODUCTS
+        )
+    finally:
+        stop_portfolio_sweeps(sweeps)
+
+async def with_registry_data(result: dict):
+    """Overlay the current name, description, stage and observations on an evaluation and hash it"""
+    result = {**result, **(await get_registry_fields(result["id"]))}
+    result["contentHash"] = content_hash(result)
+    return result
+
 @app.get("/maturity/products")
-async def get_all_products():
-    product_ids = get_valid_product_ids()
+async def get_all_products(request: Request, refresh: bool = False):
+    if not SNAPSHOT_ENABLED:
+        products = [await with_registry_data(product) for product in await evaluate_all_products()]
+    else:
+        product_ids = await get_valid_product_ids()
+        
+        # Serve the background snapshot; recompute synchronously when forced or when a product is missing
+        if refresh or any(get_snapshot_product(product_id) is None for product_id in product_ids):
+            await refresh_snapshot(evaluate_all_products)
+        
+        products = [get_snapshot_product(product_id) for product_id in product_ids]
+        products = [await with_registry_data(product) for product in products if product]
     
-    # Pre-fetch all UptimeRobot data in a single API call
-    uptime_data = await get_all_products_data(product_ids)
+    version = combined_hash(product["contentHash"] for product in products)
+    return cached_json_response(request, {"products": products}, version)
+
+def sse_event(event: str, data: dict):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+@app.get("/maturity/products/stream")
+async def stream_all_products():
+    """Stream live product evaluations as Server-Sent Events, each as soon as it completes"""
+    product_ids = await get_valid_product_ids()
     
-    products = []
-    for product_id in product_ids:
-        product_data = await evaluate_single_product(product_id, uptime_data.get(product_id))
-        products.append(product_data)
+    async def evaluate_one(product_id, sweeps, deadline):
+        try:
+            return product_id, await evaluate_single_product(product_id, sweeps, deadline), None
+        except Exception as e:
+            return product_id, None, e
     
-    return {"products": products}
+    async def events():
+        started_at = time.perf_counter()
+        deadline = evaluation_deadline()
+        # Products start right away and wait only on their share of the sweeps
+        sweeps = start_portfolio_sweeps(product_ids)
+        
+        statuses = {}
+        try:
+            evaluations = (evaluate_one(product_id, sweeps, deadline) for product_id in product_ids)
+            async for product_id, result, error in as_completed_limited(evaluations, MAX_CONCURRENT_PRODUCTS):
+                if error is not None:
+                    print(f"Error evaluating {product_id}: {error}")
+                    statuses[product_id] = "error"
+                    yield sse_event("product-error", {"id": product_id, "error": "Evaluation failed"})
+                    continue
+                
+                if SNAPSHOT_ENABLED:
+                    store_evaluation(result)
+                result = await with_registry_data(result)
+                statuses[product_id] = result["status"]
+                yield sse_event("product", result)
+        finally:
+            stop_portfolio_sweeps(sweeps)
+        
+        yield sse_event("summary", {
+            "total": len(product_ids),
+            "ready": sum(1 for status in statuses.values() if status == "ready"),
+            "blocked": sum(1 for status in statuses.values() if status == "blocked"),
+            "failed": sum(1 for status in statuses.values() if status == "error"),
+            "durationMs": round((time.perf_counter() - started_at) * 1000, 2)
+        })
+    
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
 
 @app.get("/maturity/products/{product_id}")
-async def evaluate_product(product_id: str):
-    return await evaluate_single_product(product_id)
+async def evaluate_product(product_id: str, request: Request, refresh: bool = False):
+    if not SNAPSHOT_ENABLED:
+        result = await with_registry_data(await evaluate_single_product(product_id))
+        return cached_json_response(request, result, result["contentHash"])
+    
+    result = None if refresh else get_snapshot_product(product_id)
+    if result is None:
+        result = await evaluate_single_product(product_id)
+        if product_id in await get_valid_product_ids():
+            store_evaluation(result)
+    
+    result = await with_registry_data(result)
+    return cached_json_response(request, result, result["contentHash"])
 
-@app.patch("/maturity/products/{product_id}/stage")
-async def update_product_stage(product_id: str, stage_update: StageUpdate):
-    valid_product_ids = get_valid_product_ids()
+@app.get("/maturity/products/{product_id}/bugs")
+async def stream_product_bugs(product_id: str):
+    """Stream the product's Jira bug tasks as NDJSON, one issue per line"""
+    if product_id not in await get_valid_product_ids():
+        raise HTTPException(status_code=404, detail="Product not found")
     
-    if product_id not in valid_product_ids:
+    async def ndjson_lines():
+        try:
+            async for bug in iter_bug_tasks_by_project(product_id.upper()):
+                yield json.dumps(bug) + "\n"
+        except Exception as e:
+            print(f"Error streaming bug tasks for {product_id}: {e}")
+            yield json.dumps({"error": "Failed to fetch bug tasks from Jira"}) + "\n"
+    
+    return StreamingResponse(ndjson_lines(), media_type="application/x-ndjson")
+
+@app.get("/maturity/products/{product_id}/latency")
+async def get_product_latency_history(product_id: str, days: int = 7):
+    """Latency statistics over the stored response time history"""
+    if product_id not in await get_valid_product_ids():
         raise HTTPException(status_code=404, detail="Product not found")
     
-    # Load current stages, update the specific product, and save
-    stages = load_stages()
-    if product_id not in stages:
-        stages[product_id] = {}
-    stages[product_id]["stage"] = stage_update.stage
-    save_stages(stages)
+    if days < 1:
+        raise HTTPException(status_code=400, detail="days must be at least 1")
+    
+    stats = await get_response_time_window_stats(product_id, days)
+    return {"product_id": product_id, "days": days, "response_times": stats}
+
+@app.delete("/admin/cache/uptime")
+async def invalidate_uptime_cache():
+    """Drop cached UptimeRobot data so the next evaluation fetches it fresh"""
+    clear_uptime_cache()
+    return {"success": True, "message": "UptimeRobot cache cleared"}
+
+@app.get("/admin/circuits")
+async def get_circuits():
+    """State of the circuit breaker of each upstream service"""
+    return {"circuits": get_circuit_states()}
+
+@app.patch("/maturity/products")
+async def update_products_stages(bulk_update: BulkStageUpdate):
+    """Update the stage and/or observations of many products in one write"""
+    valid_product_ids = set(await get_valid_product_ids())
+    
+    # Validate every item first; only valid items are written, all together
+    results = []
+    changes = []
+    for item in bulk_update.updates:
+        fields = item.dict(include={"stage", "observations"}, exclude_unset=True)
+        if item.product_id not in valid_product_ids:
+            results.append({"product_id": item.product_id, "success": False, "error": "Product not found"})
+        elif not fields:
+            results.append({"product_id": item.product_id, "success": False, "error": "Nothing to update"})
+        else:
+            results.append({"product_id": item.product_id, "success": True, **fields})
+            changes.append((item.product_id, fields))
+    
+    applied = iter(await update_stage_fields_bulk(changes))
+    for result in results:
+        # A product deleted since validation is reported as not found
+        if result["success"] and not next(applied):
+            result.update(success=False, error="Product not found")
+    
+    updated = sum(1 for result in results if result["success"])
+    return {
+        "success": updated == len(results),
+        "updated": updated,
+        "failed": len(results) - updated,
+        "results": results,
+        "message": f"Updated {updated} of {len(results)} products"
+    }
+
+@app.patch("/maturity/products/{product_id}/stage")
+async def update_product_stage(product_id: str, stage_update: StageUpdate):
+    # Update only this product's stage
+    if not await update_stage_fields(product_id, stage=stage_update.stage):
+        raise HTTPException(status_code=404, detail="Product not found")
     
     return {
         "success": True,
@@ -181,18 +374,10 @@ async def update_product_stage(product_id: str, stage_update: StageUpdate):
 
 @app.patch("/maturity/products/{product_id}")
 async def update_product_observations(product_id: str, observations_update: ObservationsUpdate):
-    valid_product_ids = get_valid_product_ids()
-    
-    if product_id not in valid_product_ids:
+    # Update only this product's observations
+    if not await update_stage_fields(product_id, observations=observations_update.observations):
         raise HTTPException(status_code=404, detail="Product not found")
     
-    # Load current data, update observations, and save
-    stages = load_stages()
-    if product_id not in stages:
-        stages[product_id] = {}
-    stages[product_id]["observations"] = observations_update.observations
-    save_stages(stages)
-    
     return {
         "success": True,
         "product_id": product_id,
@@ -200,27 +385,41 @@ async def update_product_observations(product_id: str, observations_update: Obse
         "message": f"Observations updated for product {product_id}"
     }
 
-async def evaluate_single_product(product_id: str, uptime_data: dict = None):
-    
-    staging_url = f"https://{product_id}-staging.dooor.ai"
+# Source each criterion is computed from
+CRITERIA_SOURCES = {
+    "staging": "probe",
+    "security_headers": "probe",
+    "bugs_critical": "jira",
+    "bugs_medium_plus": "jira",
+    "bugs_all": "jira",
+    "uptime_99": "uptime",
+    "uptime_95": "uptime",
+    "latency_avg_500": "response_times",
+    "latency_avg_1000": "response_times",
+    "latency_p95": "response_times",
+    "active_users_1": "users",
+    "active_users_2": "users",
+    "active_users_3": "users",
+}
 
-    staging = await check_staging_alive(staging_url)
-    bugs_critical = await get_open_bugs_by_priority(product_id.upper(), ['Highest', 'High'])
-    bugs_medium_plus = await get_open_bugs_by_priority(product_id.upper(), ['Highest', 'High', 'Medium'])
-    bugs_all = await get_open_all_bugs(product_id.upper())
+async def evaluate_single_product(product_id: str, sweeps: dict = None, deadline: float = None):
     
-    # Use pre-fetched uptime data if available, otherwise fetch individually
-    if uptime_data:
-        uptime = uptime_data.get('uptime')
-        response_times = uptime_data.get('response_times')
-    else:
-        uptime = await get_product_uptime(product_id)
-        response_times = await get_product_response_times(product_id)
-    security_headers = await check_product_security(product_id)
-    if product_id == "chorus":
-        users = await get_active_users()
-    else:
-        users = 0
+    staging_url = get_staging_url(product_id)
+
+    # Fetch all sources at once; sources still running at the deadline are left out
+    probe_method = ((await get_product(product_id)) or {}).get("probe_method")
+    collected = await collect_product_sources(product_id, sweeps, probe_method, deadline)
+    sources = collected["values"]
+
+    staging = sources["staging"]
+    bugs_critical = sources["bugs_critical"]
+    bugs_medium_plus = sources["bugs_medium_plus"]
+    bugs_all = sources["bugs_all"]
+    uptime = sources["uptime"]
+    response_times = sources["response_times"]
+    security_headers = sources["security_headers"]
+    users = sources["users"]
+    security_report = sources["security_report"]
     #flow = await get_flow_completion_rate(product_id)
 
     criterios = {
@@ -234,17 +433,22 @@ async def evaluate_single_product(product_id: str, uptime_data: dict = None):
         "latency_avg_1000": response_times is not None and response_times.get('average_ms', float('inf')) < 1000,
         "latency_p95": response_times is not None and response_times.get('p95_ms', float('inf')) < 1000,
         "security_headers": security_headers,
-        "active_users_1": users > 3,
-        "active_users_2": users > 10,
-        "active_users_3": users > 50,  
+        "active_users_1": users is not None and users > 3,
+        "active_users_2": users is not None and users > 10,
+        "active_users_3": users is not None and users > 50,  
     }
+    
+    # Criteria whose source has no value at all are unknown (None), not failed
+    for criterion, source in CRITERIA_SOURCES.items():
+        if source in collected["unknown"]:
+            criterios[criterion] = None
 
-    peso = {True: 1, False: 0}
+    peso = {True: 1, False: 0, None: 0}
     score = sum(peso[v] for v in criterios.values()) / len(criterios) * 100
 
-    if all(v for v in criterios.values()):
+    if all(v is True for v in criterios.values()):
         status = "READY"
-    elif any(not v for v in criterios.values()):
+    elif any(v is False for v in criterios.values()):
         status = "BLOCKED"
     else:
         status = "ATTENTION"
@@ -259,33 +463,27 @@ async def evaluate_single_product(product_id: str, uptime_data: dict = None):
     # Criteria are already boolean values
     criteria_boolean = criterios
     
-    # Load current stage and observations from JSON file
-    stages = load_stages()
-    product_data = stages.get(product_id, {})
-    current_stage = product_data.get("stage")
-    observations = product_data.get("observations")
-    
-    # Load product details
-    products = load_products()
-    product_info = products.get(product_id, {})
-    product_name = product_info.get("name", product_id)
-    product_description = product_info.get("description")
+    registry_fields = await get_registry_fields(product_id)
     
     return {
         "id": product_id,
-        "name": product_name,
-        "stage": current_stage,
+        "name": registry_fields["name"],
+        "stage": registry_fields["stage"],
         "targetStage": None,
-        "description": product_description,
+        "description": registry_fields["description"],
         "daysInStage": None,
         "status": status_mapping.get(status, "in-progress"),
         "readinessScore": score,
         "url": staging_url,
         "criteria": criteria_boolean,
-        "metrics": {},
+        "metrics": {"security": security_report["summary"]} if security_report else {},
         "blockers": [],
-        "observations": observations,
-        "kickoffDate": None
+        "observations": registry_fields["observations"],
+        "kickoffDate": None,
+        "sourceTimings": collected["timings_ms"],
+        "timedOutSources": collected["timed_out"],
+        "staleSources": collected["stale"],
+        "evaluatedAt": datetime.now(timezone.utc).isoformat()
     }
 
 
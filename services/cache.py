@@ -0,0 +1,79 @@
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional
+
+class TTLCache:
+    """
+    In-memory cache with a timestamp per key, single-flight loading and
+    stale-while-revalidate
+
+    Entries younger than `ttl` are served as-is. Entries older than `ttl` but
+    younger than `ttl + stale_ttl` are served immediately while one background
+    refresh runs. Anything older waits for a fresh load. Concurrent misses for
+    the same key share a single in-flight load.
+    """
+
+    def __init__(self, ttl: float, stale_ttl: float = 0):
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self._entries: Dict[Hashable, Dict] = {}
+        self._inflight: Dict[Hashable, asyncio.Task] = {}
+
+    async def get(self, key: Hashable, loader: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Get a cached value, loading it with `loader` when missing or expired
+
+        Args:
+            key: Cache key
+            loader: Coroutine function returning the fresh value, or None on error
+
+        Returns:
+            The cached or freshly loaded value, or None if loading failed
+        """
+        entry = self._entries.get(key)
+        if entry is not None:
+            age = time.time() - entry['timestamp']
+            if age < self.ttl:
+                return entry['value']
+            if age < self.ttl + self.stale_ttl:
+                self._refresh(key, loader)
+                return entry['value']
+
+        return await asyncio.shield(self._refresh(key, loader))
+
+    def set(self, key: Hashable, value: Any):
+        """Store a value for a key, resetting its age"""
+        self._entries[key] = {'value': value, 'timestamp': time.time()}
+
+    def peek(self, key: Hashable) -> Optional[Any]:
+        """Get a value only if it is cached and fresh, without loading it"""
+        entry = self._entries.get(key)
+        if entry is not None and time.time() - entry['timestamp'] < self.ttl:
+            return entry['value']
+        return None
+
+    def invalidate(self, key: Optional[Hashable] = None):
+        """Drop one key, or every key when none is given"""
+        if key is None:
+            self._entries.clear()
+        else:
+            self._entries.pop(key, None)
+
+    def _refresh(self, key: Hashable, loader: Callable[[], Awaitable[Any]]) -> asyncio.Task:
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._load(key, loader))
+            self._inflight[key] = task
+        return task
+
+    async def _load(self, key: Hashable, loader: Callable[[], Awaitable[Any]]) -> Any:
+        try:
+            value = await loader()
+            if value is not None:
+                self.set(key, value)
+            return value
+        except Exception as e:
+            print(f"Error refreshing cache entry {key}: {e}")
+            return None
+        finally:
+            self._inflight.pop(key, None)
@@ -0,0 +1,119 @@
+import os
+import time
+from dotenv import load_dotenv
+from typing import Dict, Optional
+
+load_dotenv()
+
+# Consecutive failures that open a circuit, and how long it stays open before probing again
+CIRCUIT_FAILURE_THRESHOLD = int(os.getenv("CIRCUIT_FAILURE_THRESHOLD", "5"))
+CIRCUIT_RESET_TIMEOUT = float(os.getenv("CIRCUIT_RESET_TIMEOUT_SECONDS", "30"))
+# Trial requests let through at the same time while a circuit is half-open
+CIRCUIT_HALF_OPEN_MAX_CALLS = int(os.getenv("CIRCUIT_HALF_OPEN_MAX_CALLS", "1"))
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+class CircuitOpenError(Exception):
+    """Raised instead of sending a request while the upstream's circuit is open"""
+
+    def __init__(self, name: str, retry_after: float):
+        super().__init__(f"Circuit for {name} is open, retry in {retry_after:.1f}s")
+        self.name = name
+        self.retry_after = retry_after
+
+class CircuitBreaker:
+    """
+    Failure counter for one upstream
+
+    After `failure_threshold` consecutive failures the circuit opens and
+    every call fails immediately for `reset_timeout` seconds. Then it is
+    half-open: up to `half_open_max_calls` trial calls go through, and the
+    first result closes the circuit again (success) or reopens it (failure).
+    """
+
+    def __init__(
+        self,
+        name: str,
+        failure_threshold: int = CIRCUIT_FAILURE_THRESHOLD,
+        reset_timeout: float = CIRCUIT_RESET_TIMEOUT,
+        half_open_max_calls: int = CIRCUIT_HALF_OPEN_MAX_CALLS
+    ):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.half_open_max_calls = half_open_max_calls
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self.half_open_calls = 0
+        self.last_error: Optional[str] = None
+
+    def before_call(self):
+        """
+        Reserve a call, raising CircuitOpenError when the circuit rejects it
+
+        Every reserved call must be followed by record_success,
+        record_failure or release.
+        """
+        if self.state == OPEN:
+            remaining = self.opened_at + self.reset_timeout - time.monotonic()
+            if remaining > 0:
+                raise CircuitOpenError(self.name, remaining)
+            self.state = HALF_OPEN
+            self.half_open_calls = 0
+
+        if self.state == HALF_OPEN:
+            if self.half_open_calls >= self.half_open_max_calls:
+                raise CircuitOpenError(self.name, 0)
+            self.half_open_calls += 1
+
+    def record_success(self):
+        """Close the circuit after a successful call"""
+        self.release()
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = None
+
+    def record_failure(self, error: str):
+        """Count a failed call, opening the circuit at the threshold or on a failed trial"""
+        self.release()
+        self.failures += 1
+        self.last_error = error
+        if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+            if self.state != OPEN:
+                print(f"Circuit for {self.name} opened after {self.failures} failures: {error}")
+            self.state = OPEN
+            self.opened_at = time.monotonic()
+
+    def release(self):
+        """Give back a reserved call without a verdict (e.g. it was cancelled)"""
+        if self.state == HALF_OPEN and self.half_open_calls > 0:
+            self.half_open_calls -= 1
+
+    def snapshot(self) -> Dict:
+        """Current state, for the admin endpoint"""
+        retry_in = None
+        if self.state == OPEN:
+            retry_in = round(max(0.0, self.opened_at + self.reset_timeout - time.monotonic()), 1)
+        return {
+            "state": self.state,
+            "consecutive_failures": self.failures,
+            "retry_in_seconds": retry_in,
+            "last_error": self.last_error
+        }
+
+_breakers: Dict[str, CircuitBreaker] = {}
+
+def get_circuit_breaker(name: str) -> CircuitBreaker:
+    """Get the breaker of an upstream (e.g. 'jira' or 'staging:chorus-staging.dooor.ai')"""
+    breaker = _breakers.get(name)
+    if breaker is None:
+        breaker = CircuitBreaker(name)
+        _breakers[name] = breaker
+    return breaker
+
+def get_circuit_states() -> Dict[str, Dict]:
+    """State of every breaker created so far"""
+    return {name: breaker.snapshot() for name, breaker in sorted(_breakers.items())}
@@ -0,0 +1,207 @@
+import asyncio
+import time
+from typing import Any, Awaitable, Dict, Hashable, List, Optional
+from services.concurrency import evaluation_deadline, seconds_left
+from services.staging import is_staging_alive
+from services.posthog import get_active_users, get_active_users_by_product
+from services.jira import get_open_bug_counts, get_portfolio_bug_index, summarize_bug_counts
+from services.uptime_robot import get_all_products_data
+from services.security import has_essential_security_headers, build_security_report
+from services.probe import probe_staging
+from services.response_history import get_response_time_window_stats, LATENCY_WINDOW_DAYS
+
+# Sources that return None when their upstream could not be queried
+FAILED_IF_NONE = ("jira", "users")
+
+class SourceUnavailableError(Exception):
+    """Raised by a source whose upstream could not be queried, when None is a real value"""
+
+# Last value each source returned per product, used when a source misses the deadline
+_last_known_values: Dict[Hashable, Any] = {}
+
+async def _timed(name: str, awaitable: Awaitable[Any], timings: Dict[str, float]) -> Any:
+    start = time.perf_counter()
+    try:
+        return await awaitable
+    finally:
+        timings[name] = round((time.perf_counter() - start) * 1000, 2)
+
+def start_portfolio_sweeps(product_ids: List[str]) -> Dict[str, asyncio.Task]:
+    """
+    Start the portfolio-wide fetches shared by every product's evaluation:
+    all UptimeRobot monitors, every product's Jira bug counts and every
+    product's PostHog active users, one request each
+
+    The caller must pass the result to stop_portfolio_sweeps once the
+    evaluations are done.
+
+    Args:
+        product_ids: Products being evaluated
+
+    Returns:
+        Running tasks under 'uptime', 'bugs' and 'users'
+    """
+    return {
+        "uptime": asyncio.ensure_future(get_all_products_data(product_ids)),
+        "bugs": asyncio.ensure_future(get_portfolio_bug_index([product_id.upper() for product_id in product_ids])),
+        "users": asyncio.ensure_future(get_active_users_by_product()),
+    }
+
+def stop_portfolio_sweeps(sweeps: Dict[str, asyncio.Task]):
+    """Cancel the sweeps still running, e.g. after every product hit the deadline"""
+    for task in sweeps.values():
+        if not task.done():
+            task.cancel()
+
+_NO_SHARE = object()
+_SWEEP_FAILED = object()
+
+async def _sweep_share(sweeps: Optional[Dict[str, asyncio.Task]], sweep: str, key: str, default: Any = None) -> Any:
+    """
+    One product's entry of a portfolio sweep, waiting for the sweep if needed
+
+    Returns:
+        The entry (or `default` when the sweep has none for the product),
+        _NO_SHARE when there is no such sweep, or _SWEEP_FAILED when it failed
+    """
+    task = (sweeps or {}).get(sweep)
+    if task is None:
+        return _NO_SHARE
+    try:
+        # Shielded: a product hitting the deadline must not cancel the sweep for the others
+        result = await asyncio.shield(task)
+    except Exception as e:
+        print(f"Portfolio {sweep} sweep failed: {e}")
+        return _SWEEP_FAILED
+    if result is None:
+        return _SWEEP_FAILED
+    return result.get(key, default)
+
+async def _bug_counts_source(project_key: str, sweeps) -> Optional[Dict[str, int]]:
+    priority_counts = await _sweep_share(sweeps, "bugs", project_key)
+    # Per-project searches are separate JQL queries, worth trying when the bulk one failed
+    if priority_counts is _NO_SHARE or priority_counts is _SWEEP_FAILED or priority_counts is None:
+        return await get_open_bug_counts(project_key)
+    return summarize_bug_counts(priority_counts)
+
+async def _uptime_source(product_id: str, sweeps, field: str) -> Any:
+    # None is a product without a monitor; an outage goes through the stale/unknown path instead
+    uptime_data = await _sweep_share(sweeps, "uptime", product_id, default=_NO_SHARE)
+    if uptime_data is _SWEEP_FAILED:
+        raise SourceUnavailableError("UptimeRobot could not be queried")
+    if uptime_data is _NO_SHARE:
+        # The same cached getMonitors call as the sweep
+        products_data = await get_all_products_data([product_id])
+        if products_data is None:
+            raise SourceUnavailableError("UptimeRobot could not be queried")
+        uptime_data = products_data[product_id]
+    return uptime_data.get(field)
+
+async def _users_source(product_id: str, sweeps) -> Optional[int]:
+    # Products without any event in the breakdown have no active users
+    users = await _sweep_share(sweeps, "users", product_id, default=0)
+    if users is _NO_SHARE:
+        return await get_active_users(product_id)
+    if users is _SWEEP_FAILED:
+        # Per product it is the same breakdown query that just failed; stale or unknown instead
+        return None
+    return users
+
+async def collect_product_sources(
+    product_id: str,
+    sweeps: Dict[str, asyncio.Task] = None,
+    probe_method: str = None,
+    deadline: float = None
+) -> Dict:
+    """
+    Fetch every source used by the maturity criteria of a product concurrently
+
+    Args:
+        product_id: Product identifier (e.g., 'chorus', 'cadence')
+        sweeps: Portfolio sweeps from start_portfolio_sweeps, if any; the
+            product waits for its share of them while its own sources run.
+            When a sweep failed, Jira is queried for the product alone and
+            UptimeRobot and active users are marked stale or unknown
+        probe_method: HTTP method for the staging probe ('HEAD' or 'GET'), if configured
+        deadline: Deadline from evaluation_deadline() shared with the rest of
+            the request (a new one is started when not given)
+
+    Returns:
+        Dictionary with the source values under 'values', how long each
+        source took, in milliseconds, under 'timings_ms', the sources that
+        missed the deadline under 'timed_out', the sources answered from
+        their last known value under 'stale' and the sources without any
+        value under 'unknown'. Values of unknown sources are None.
+    """
+    if deadline is None:
+        deadline = evaluation_deadline()
+    project_key = product_id.upper()
+
+    values = {}
+    sources = {
+        # One request to the staging URL feeds both the staging and security criteria
+        "probe": probe_staging(product_id, probe_method),
+        # Shares of the portfolio sweeps (see `sweeps` for what happens when one failed)
+        "jira": _bug_counts_source(project_key, sweeps),
+        "uptime": _uptime_source(product_id, sweeps, 'uptime'),
+        "response_times": _uptime_source(product_id, sweeps, 'response_times'),
+        "users": _users_source(product_id, sweeps),
+    }
+
+    # Latency criteria over the stored history window, when configured
+    if LATENCY_WINDOW_DAYS:
+        sources["response_times_history"] = get_response_time_window_stats(product_id, LATENCY_WINDOW_DAYS)
+
+    timings = {}
+    tasks = {name: asyncio.ensure_future(_timed(name, source, timings)) for name, source in sources.items()}
+    done, pending = await asyncio.wait(tasks.values(), timeout=seconds_left(deadline))
+    for task in pending:
+        task.cancel()
+    await asyncio.gather(*pending, return_exceptions=True)
+
+    timed_out, stale, unknown = [], [], []
+    for name, task in tasks.items():
+        if task in done and task.exception() is None:
+            if task.result() is not None or name not in FAILED_IF_NONE:
+                values[name] = task.result()
+                continue
+        elif task in done:
+            print(f"Error fetching {name} for {product_id}: {task.exception()}")
+        else:
+            timed_out.append(name)
+        # Fall back to the last value this source returned, or mark it unknown
+        if (product_id, name) in _last_known_values:
+            values[name] = _last_known_values[(product_id, name)]
+            stale.append(name)
+        else:
+            values[name] = None
+            unknown.append(name)
+
+    for name, value in values.items():
+        if name not in stale and name not in unknown:
+            _last_known_values[(product_id, name)] = value
+
+    probe = values.pop("probe")
+    if probe is None:
+        values["staging"] = values["security_headers"] = values["security_report"] = None
+    else:
+        values["staging"] = is_staging_alive(probe)
+        values["security_headers"] = has_essential_security_headers(probe)
+        values["security_report"] = build_security_report(probe)
+
+    history = values.pop("response_times_history", None)
+    if history and history['p95_ms'] is not None:
+        values["response_times"] = history
+
+    bug_counts = values.pop("jira") or {}
+    values["bugs_critical"] = bug_counts.get('critical')
+    values["bugs_medium_plus"] = bug_counts.get('medium_plus')
+    values["bugs_all"] = bug_counts.get('all')
+
+    return {
+        "values": values,
+        "timings_ms": timings,
+        "timed_out": timed_out,
+        "stale": stale,
+        "unknown": unknown
+    }
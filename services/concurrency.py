@@ -0,0 +1,97 @@
+import asyncio
+import os
+import time
+from contextlib import asynccontextmanager
+from dotenv import load_dotenv
+from typing import Any, AsyncIterator, Awaitable, Dict, Iterable, List
+
+load_dotenv()
+
+# Maximum number of products evaluated at the same time in a single request
+MAX_CONCURRENT_PRODUCTS = int(os.getenv("MAX_CONCURRENT_PRODUCTS", "10"))
+
+# Maximum number of in-flight calls to each upstream service, shared by all requests
+UPSTREAM_CONCURRENCY = {
+    "jira": int(os.getenv("JIRA_MAX_CONCURRENCY", "5")),
+    "uptime_robot": int(os.getenv("UPTIMEROBOT_MAX_CONCURRENCY", "2")),
+    "posthog": int(os.getenv("POSTHOG_MAX_CONCURRENCY", "3")),
+    "staging": int(os.getenv("STAGING_MAX_CONCURRENCY", "10")),
+}
+
+# Time budget of one evaluation request, shared by every source it waits on
+EVALUATION_DEADLINE = float(os.getenv("EVALUATION_DEADLINE_SECONDS", "8"))
+
+_upstream_semaphores: Dict[str, asyncio.Semaphore] = {}
+
+def _get_upstream_semaphore(service: str) -> asyncio.Semaphore:
+    semaphore = _upstream_semaphores.get(service)
+    if semaphore is None:
+        semaphore = asyncio.Semaphore(UPSTREAM_CONCURRENCY.get(service, 5))
+        _upstream_semaphores[service] = semaphore
+    return semaphore
+
+@asynccontextmanager
+async def upstream_slot(service: str):
+    """
+    Hold one of the concurrency slots of an upstream service
+
+    Args:
+        service: Upstream name (e.g., 'jira', 'uptime_robot', 'posthog', 'staging')
+    """
+    async with _get_upstream_semaphore(service):
+        yield
+
+async def gather_limited(awaitables: Iterable[Awaitable[Any]], limit: int) -> List[Any]:
+    """
+    Await all awaitables concurrently with at most `limit` running at once
+
+    Args:
+        awaitables: Coroutines to run
+        limit: Maximum number of coroutines running at the same time
+
+    Returns:
+        Results in the same order as the awaitables
+    """
+    semaphore = asyncio.Semaphore(max(1, limit))
+
+    async def run(awaitable):
+        async with semaphore:
+            return await awaitable
+
+    return await asyncio.gather(*(run(a) for a in awaitables))
+
+async def as_completed_limited(awaitables: Iterable[Awaitable[Any]], limit: int) -> AsyncIterator[Any]:
+    """
+    Run awaitables concurrently with at most `limit` at once, yielding each
+    result as soon as it is ready
+
+    Args:
+        awaitables: Coroutines to run
+        limit: Maximum number of coroutines running at the same time
+
+    Yields:
+        Results in completion order
+    """
+    semaphore = asyncio.Semaphore(max(1, limit))
+
+    async def run(awaitable):
+        async with semaphore:
+            return await awaitable
+
+    tasks = [asyncio.ensure_future(run(a)) for a in awaitables]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            yield await next_done
+    finally:
+        # Stop the remaining work if the consumer goes away early
+        for task in tasks:
+            if not task.done():
+                task.cancel()
+
+def evaluation_deadline() -> float:
+    """Deadline (monotonic clock) of an evaluation starting now"""
+    return time.monotonic() + EVALUATION_DEADLINE
+
+def seconds_left(deadline: float) -> float:
+    """Seconds remaining until a deadline, never negative"""
+    return max(0.0, deadline - time.monotonic())
@@ -0,0 +1,56 @@
+import hashlib
+import json
+from fastapi import Request, Response
+from fastapi.responses import JSONResponse
+from typing import Dict, Iterable
+
+# Evaluation fields that change on every run without changing its meaning
+VOLATILE_FIELDS = ("sourceTimings", "evaluatedAt")
+
+def content_hash(evaluation: Dict) -> str:
+    """
+    Stable hash of an evaluation result, ignoring volatile fields
+
+    Args:
+        evaluation: Evaluation returned by evaluate_single_product
+
+    Returns:
+        Hex digest that only changes when the evaluation content changes
+    """
+    stable = {k: v for k, v in evaluation.items() if k not in VOLATILE_FIELDS and k != "contentHash"}
+    encoded = json.dumps(stable, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(encoded.encode()).hexdigest()[:32]
+
+def combined_hash(hashes: Iterable[str]) -> str:
+    """Hash of many content hashes, in order"""
+    return hashlib.sha256(",".join(hashes).encode()).hexdigest()[:32]
+
+def etag_matches(request: Request, etag: str) -> bool:
+    """Whether the request's If-None-Match header already names this ETag"""
+    if_none_match = request.headers.get("if-none-match")
+    if not if_none_match:
+        return False
+    tags = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in tags or any(tag.removeprefix("W/") == etag for tag in tags)
+
+def cached_json_response(request: Request, payload: Dict, version: str) -> Response:
+    """
+    JSON response with an ETag, or 304 when the client's copy is current
+
+    Payloads carry registry fields (stage, observations, name) that users
+    edit at any time, so clients must revalidate on every use; an unchanged
+    payload costs them a 304 without body.
+
+    Args:
+        request: Incoming request
+        payload: Response body
+        version: Content hash identifying the payload
+
+    Returns:
+        A 304 response without body, or the JSON payload
+    """
+    etag = f'"{version}"'
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if etag_matches(request, etag):
+        return Response(status_code=304, headers=headers)
+    return JSONResponse(payload, headers=headers)
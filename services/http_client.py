@@ -0,0 +1,179 @@
+import asyncio
+import importlib.util
+import os
+import httpx
+from contextlib import asynccontextmanager
+from dotenv import load_dotenv
+from typing import AsyncIterator, Dict, Optional
+from services.circuit_breaker import CircuitBreaker, get_circuit_breaker
+from services.concurrency import upstream_slot
+from services.rate_limit import acquire_token, backoff_delay, is_retryable, RETRY_MAX_ATTEMPTS, RETRY_STATUSES
+
+load_dotenv()
+
+# Connection pool configuration shared by every service module
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "100"))
+HTTP_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("HTTP_MAX_KEEPALIVE_CONNECTIONS", "20"))
+HTTP_MAX_CONNECTIONS_PER_HOST = int(os.getenv("HTTP_MAX_CONNECTIONS_PER_HOST", "10"))
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "30"))
+HTTP2_ENABLED = os.getenv("HTTP2_ENABLED", "false").lower() == "true"
+
+# Per-service timeouts in seconds
+SERVICE_TIMEOUTS = {
+    "jira": httpx.Timeout(float(os.getenv("JIRA_TIMEOUT", "10")), connect=5.0),
+    "uptime_robot": httpx.Timeout(float(os.getenv("UPTIMEROBOT_TIMEOUT", "15")), connect=5.0),
+    "posthog": httpx.Timeout(float(os.getenv("POSTHOG_TIMEOUT", "20")), connect=5.0),
+    "staging": httpx.Timeout(float(os.getenv("STAGING_TIMEOUT", "3"))),
+}
+DEFAULT_TIMEOUT = httpx.Timeout(10.0)
+
+_client: Optional[httpx.AsyncClient] = None
+_host_semaphores: Dict[str, asyncio.Semaphore] = {}
+
+def _create_client() -> httpx.AsyncClient:
+    http2 = HTTP2_ENABLED
+    if http2 and importlib.util.find_spec("h2") is None:
+        print("HTTP/2 requested but the 'h2' package is not installed, falling back to HTTP/1.1")
+        http2 = False
+
+    limits = httpx.Limits(
+        max_connections=HTTP_MAX_CONNECTIONS,
+        max_keepalive_connections=HTTP_MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry=HTTP_KEEPALIVE_EXPIRY
+    )
+    return httpx.AsyncClient(limits=limits, timeout=DEFAULT_TIMEOUT, http2=http2)
+
+async def start_http_client():
+    """Create the shared HTTP client (called from the app lifespan)"""
+    global _client
+    if _client is None or _client.is_closed:
+        _client = _create_client()
+
+async def close_http_client():
+    """Close the shared HTTP client and its pooled connections"""
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+def get_http_client() -> httpx.AsyncClient:
+    """
+    Get the shared HTTP client
+
+    The client is normally created by the app lifespan; scripts that call the
+    services directly get one created on first use.
+    """
+    global _client
+    if _client is None or _client.is_closed:
+        _client = _create_client()
+    return _client
+
+def _circuit_for(service: str, host: str) -> CircuitBreaker:
+    # Staging hosts belong to different products and fail independently
+    if service == "staging":
+        return get_circuit_breaker(f"staging:{host}")
+    return get_circuit_breaker(service)
+
+@asynccontextmanager
+async def _guarded(service: str, host: str):
+    """Fail fast while the upstream's circuit is open, and report the outcome to it"""
+    breaker = _circuit_for(service, host)
+    breaker.before_call()
+    outcome = []
+    try:
+        yield outcome
+    except httpx.HTTPError as e:
+        breaker.record_failure(f"{type(e).__name__}: {e}")
+        raise
+    except BaseException:
+        breaker.release()
+        raise
+    else:
+        response = outcome[0] if outcome else None
+        if response is not None and response.status_code >= 500:
+            breaker.record_failure(f"HTTP {response.status_code}")
+        else:
+            breaker.record_success()
+
+@asynccontextmanager
+async def _host_slot(host: str):
+    semaphore = _host_semaphores.get(host)
+    if semaphore is None:
+        semaphore = asyncio.Semaphore(HTTP_MAX_CONNECTIONS_PER_HOST)
+        _host_semaphores[host] = semaphore
+    async with semaphore:
+        yield
+
+async def request(service: str, method: str, url: str, **kwargs) -> httpx.Response:
+    """
+    Send a request to an upstream service through the shared client
+
+    Requests to vendor APIs are paced by the vendor's token bucket, and
+    rate-limited (429) or temporarily failing (502-504, transport errors)
+    attempts are retried with backoff, honouring Retry-After.
+
+    Args:
+        service: Upstream name, used for the concurrency limit and default timeout
+        method: HTTP method
+        url: Request URL
+        **kwargs: Extra arguments for httpx.AsyncClient.request
+
+    Returns:
+        The httpx response
+
+    Raises:
+        CircuitOpenError: The upstream's circuit is open
+    """
+    kwargs.setdefault("timeout", SERVICE_TIMEOUTS.get(service, DEFAULT_TIMEOUT))
+    host = httpx.URL(url).host
+    max_attempts = RETRY_MAX_ATTEMPTS if is_retryable(service) else 1
+
+    for attempt in range(1, max_attempts + 1):
+        try:
+            async with _guarded(service, host) as outcome:
+                # Checked against the circuit first, so rejected calls fail fast and spend no token
+                await acquire_token(service)
+                async with upstream_slot(service), _host_slot(host):
+                    response = await get_http_client().request(method, url, **kwargs)
+                    outcome.append(response)
+        except httpx.TransportError as e:
+            if attempt == max_attempts:
+                raise
+            delay = backoff_delay(attempt)
+            print(f"{service} request failed ({e}), retrying in {delay:.1f}s")
+        else:
+            if response.status_code not in RETRY_STATUSES or attempt == max_attempts:
+                return response
+            delay = backoff_delay(attempt, response)
+            if delay is None:
+                return response
+            print(f"{service} returned HTTP {response.status_code}, retrying in {delay:.1f}s")
+            await response.aclose()
+        await asyncio.sleep(delay)
+
+@asynccontextmanager
+async def stream(service: str, method: str, url: str, **kwargs) -> AsyncIterator[httpx.Response]:
+    """
+    Send a request through the shared client without reading the response body
+
+    The body is only downloaded if the caller reads it; leaving the block
+    closes the response.
+
+    Args:
+        service: Upstream name, used for the concurrency limit and default timeout
+        method: HTTP method
+        url: Request URL
+        **kwargs: Extra arguments for httpx.AsyncClient.stream
+
+    Yields:
+        The httpx response with headers available
+
+    Raises:
+        CircuitOpenError: The upstream's circuit is open
+    """
+    kwargs.setdefault("timeout", SERVICE_TIMEOUTS.get(service, DEFAULT_TIMEOUT))
+    host = httpx.URL(url).host
+    async with _guarded(service, host) as outcome, upstream_slot(service), _host_slot(host):
+        async with get_http_client().stream(method, url, **kwargs) as response:
+            outcome.append(response)
+            yield response
@@ -1,7 +1,11 @@
-import requests
+import asyncio
+import httpx
+import math
 import os
+import time
 from dotenv import load_dotenv
-from typing import List, Dict
+from typing import AsyncIterator, Awaitable, Callable, List, Dict, Optional
+from services.http_client import request
 
 load_dotenv()
 
@@ -9,6 +13,76 @@ JIRA_URL = os.getenv("JIRA_URL")
 JIRA_USERNAME = os.getenv("JIRA_USERNAME") 
 JIRA_API_TOKEN = os.getenv("JIRA_API_TOKEN")
 
+# Priority groups used by the maturity criteria
+CRITICAL_PRIORITIES = ['Highest', 'High']
+MEDIUM_PLUS_PRIORITIES = ['Highest', 'High', 'Medium']
+
+# Jira caps maxResults at 100 issues per search page
+SEARCH_PAGE_SIZE = 100
+
+# Open bug counts per project and priority, shared by the count functions so
+# one evaluation needs a single Jira search per project
+_open_bugs_cache = {
+    'data': {},
+    'inflight': {},
+    'ttl': int(os.getenv("JIRA_CACHE_TTL", "60"))
+}
+
+# Background sync of bug issues into a local store
+JIRA_SYNC_ENABLED = os.getenv("JIRA_SYNC_ENABLED", "true").lower() == "true"
+JIRA_SYNC_INTERVAL = int(os.getenv("JIRA_SYNC_INTERVAL", "60"))  # seconds between incremental syncs
+JIRA_FULL_SYNC_INTERVAL = int(os.getenv("JIRA_FULL_SYNC_INTERVAL", "3600"))  # seconds between full reconciliations
+JIRA_SYNC_OVERLAP_MINUTES = 2  # re-read a small overlap so clock skew never drops an update
+SYNC_FIELDS = 'project,priority,status,labels,updated'
+
+_bug_store = {
+    'issues': {},       # issue key -> {'key', 'project', 'priority', 'status', 'labels', 'updated'}
+    'counts': {},       # project key -> open bug counts by priority, rebuilt after each sync
+    'projects': set(),  # project keys covered by the store
+    'cursor': 0,        # time the last successful sync started
+    'last_full_sync': 0
+}
+
+def _to_bug_info(issue: Dict) -> Dict:
+    return {
+        'key': issue['key'],
+        'summary': issue['fields']['summary'],
+        'status': issue['fields']['status']['name'],
+        'priority': issue['fields']['priority']['name'] if issue['fields']['priority'] else 'None',
+        'assignee': issue['fields']['assignee']['displayName'] if issue['fields']['assignee'] else 'Unassigned',
+        'created': issue['fields']['created'],
+        'updated': issue['fields']['updated'],
+        'labels': issue['fields']['labels']
+    }
+
+async def iter_bug_tasks_by_project(project_key: str) -> AsyncIterator[Dict]:
+    """
+    Stream all tasks with 'bug' label from a specific Jira project, page by page
+
+    The next page is requested while the current one is being consumed, and
+    only one page of issues is held in memory at a time.
+
+    Args:
+        project_key: The Jira project key (e.g., 'PROJ')
+
+    Yields:
+        Bug tasks with relevant information
+
+    Raises:
+        httpx.HTTPError: If a Jira request fails
+    """
+    if not all([JIRA_URL, JIRA_USERNAME, JIRA_API_TOKEN]):
+        print("Missing Jira configuration")
+        return
+
+    # JQL query to find issues with bug label in specific project
+    jql = f'project = "{project_key}" AND labels = "bug"'
+    fields = 'summary,status,priority,assignee,created,updated,labels'
+
+    async for page in _iter_search_pages(jql, fields):
+        for issue in page:
+            yield _to_bug_info(issue)
+
 async def get_bug_tasks_by_project(project_key: str) -> List[Dict]:
     """
     Get all tasks with 'bug' label from a specific Jira project
@@ -19,118 +93,273 @@ async def get_bug_tasks_by_project(project_key: str) -> List[Dict]:
     Returns:
         List of bug tasks with relevant information
     """
-    if not all([JIRA_URL, JIRA_USERNAME, JIRA_API_TOKEN]):
-        print("Missing Jira configuration")
-        return []
-    
     try:
-        # Jira REST API endpoint for searching issues
-        url = f"{JIRA_URL}/rest/api/3/search"
-        
-        # JQL query to find issues with bug label in specific project
-        jql = f'project = "{project_key}" AND labels = "bug"'
-        
-        params = {
-            'jql': jql,
-            'fields': 'summary,status,priority,assignee,created,updated,labels',
-            'maxResults': 100
-        }
-        
-        headers = {
-            'Accept': 'application/json',
-            'Content-Type': 'application/json'
-        }
-        
-        auth = (JIRA_USERNAME, JIRA_API_TOKEN)
-        
-        response = requests.get(url, params=params, headers=headers, auth=auth)
-        response.raise_for_status()
-        
-        data = response.json()
-        
-        bugs = []
-        for issue in data.get('issues', []):
-            bug_info = {
-                'key': issue['key'],
-                'summary': issue['fields']['summary'],
-                'status': issue['fields']['status']['name'],
-                'priority': issue['fields']['priority']['name'] if issue['fields']['priority'] else 'None',
-                'assignee': issue['fields']['assignee']['displayName'] if issue['fields']['assignee'] else 'Unassigned',
-                'created': issue['fields']['created'],
-                'updated': issue['fields']['updated'],
-                'labels': issue['fields']['labels']
-            }
-            bugs.append(bug_info)
+        bugs = [bug async for bug in iter_bug_tasks_by_project(project_key)]
         
         print(f"Found {len(bugs)} bug tasks in project {project_key}")
         return bugs
         
-    except requests.exceptions.RequestException as e:
+    except httpx.HTTPError as e:
         print(f"Error fetching bug tasks from Jira: {e}")
         return []
     except Exception as e:
         print(f"Unexpected error: {e}")
         return []
 
-async def get_open_bugs_by_priority(project_key: str, priorities: List[str]) -> int:
+async def _iter_search_pages(jql: str, fields: str) -> AsyncIterator[List[Dict]]:
     """
-    Get count of open bugs for specific priority levels
-    
+    Run a JQL search following Jira pagination, prefetching the next page
+
     Args:
-        project_key: The Jira project key
-        priorities: List of priority names (e.g., ['Highest', 'High'])
-    
-    Returns:
-        Number of open bugs with specified priorities
+        jql: The JQL query
+        fields: Comma separated list of issue fields to return
+
+    Yields:
+        Pages of matching issues
     """
-    if not all([JIRA_URL, JIRA_USERNAME, JIRA_API_TOKEN]):
-        print("Missing Jira configuration")
-        return 0
-    
-    try:
-        url = f"{JIRA_URL}/rest/api/3/search"
-        
-        # Build priority filter
-        priority_filter = " OR ".join([f'priority = "{p}"' for p in priorities])
-        
-        # JQL for open bugs with specific priorities
-        jql = f'project = "{project_key}" AND labels = "bug" AND status != "Done" AND ({priority_filter})'
-        
+    url = f"{JIRA_URL}/rest/api/3/search"
+    headers = {
+        'Accept': 'application/json',
+        'Content-Type': 'application/json'
+    }
+    auth = (JIRA_USERNAME, JIRA_API_TOKEN)
+
+    async def fetch_page(start_at: int) -> Dict:
         params = {
             'jql': jql,
-            'maxResults': 0  # We only want the count
-        }
-        
-        headers = {
-            'Accept': 'application/json',
-            'Content-Type': 'application/json'
+            'fields': fields,
+            'startAt': start_at,
+            'maxResults': SEARCH_PAGE_SIZE
         }
-        
-        auth = (JIRA_USERNAME, JIRA_API_TOKEN)
-        
-        response = requests.get(url, params=params, headers=headers, auth=auth)
+        response = await request("jira", "GET", url, params=params, headers=headers, auth=auth)
         response.raise_for_status()
-        
-        data = response.json()
-        total_bugs = data.get('total', 0)
-        
-        print(f"Found {total_bugs} open bugs with priorities {priorities} in project {project_key}")
-        return total_bugs
-        
-    except requests.exceptions.RequestException as e:
+        return response.json()
+
+    start_at = 0
+    next_page = asyncio.ensure_future(fetch_page(start_at))
+    try:
+        while next_page is not None:
+            data = await next_page
+            page = data.get('issues', [])
+            start_at += len(page)
+
+            # Request the following page before handing this one to the caller
+            if page and start_at < data.get('total', 0):
+                next_page = asyncio.ensure_future(fetch_page(start_at))
+            else:
+                next_page = None
+
+            yield page
+    finally:
+        if next_page is not None and not next_page.done():
+            next_page.cancel()
+
+async def _search_issues(jql: str, fields: str) -> List[Dict]:
+    """
+    Run a JQL search following Jira pagination
+
+    Args:
+        jql: The JQL query
+        fields: Comma separated list of issue fields to return
+
+    Returns:
+        All matching issues
+    """
+    issues = []
+    async for page in _iter_search_pages(jql, fields):
+        issues.extend(page)
+    return issues
+
+async def _fetch_open_bug_priorities(project_key: str) -> Optional[Dict[str, int]]:
+    """
+    Fetch the open bugs of a project once and count them by priority
+
+    Args:
+        project_key: The Jira project key
+
+    Returns:
+        Mapping of priority name to number of open bugs, or None if error
+    """
+    try:
+        jql = f'project = "{project_key}" AND labels = "bug" AND status != "Done"'
+        issues = await _search_issues(jql, 'priority')
+
+        counts = {}
+        for issue in issues:
+            priority = issue['fields'].get('priority')
+            name = priority['name'] if priority else 'None'
+            counts[name] = counts.get(name, 0) + 1
+
+        print(f"Found {len(issues)} open bugs in project {project_key}: {counts}")
+        return counts
+
+    except httpx.HTTPError as e:
         print(f"Error fetching bugs from Jira: {e}")
-        return 0
+        return None
+    except Exception as e:
+        print(f"Unexpected error: {e}")
+        return None
+
+async def _refresh_open_bug_priorities(project_key: str) -> Optional[Dict[str, int]]:
+    try:
+        counts = await _fetch_open_bug_priorities(project_key)
+        if counts is not None:
+            _open_bugs_cache['data'][project_key] = {'counts': counts, 'timestamp': time.time()}
+        return counts
+    finally:
+        _open_bugs_cache['inflight'].pop(project_key, None)
+
+async def get_open_bug_priority_counts(project_key: str) -> Optional[Dict[str, int]]:
+    """
+    Get open bug counts by priority, reusing a recent or in-flight search
+
+    Args:
+        project_key: The Jira project key
+
+    Returns:
+        Mapping of priority name to number of open bugs, or None if error
+    """
+    if not all([JIRA_URL, JIRA_USERNAME, JIRA_API_TOKEN]):
+        print("Missing Jira configuration")
+        return None
+
+    stored = get_synced_bug_counts(project_key)
+    if stored is not None:
+        return stored
+
+    cached = _open_bugs_cache['data'].get(project_key)
+    if cached and time.time() - cached['timestamp'] < _open_bugs_cache['ttl']:
+        return cached['counts']
+
+    # Concurrent callers for the same project wait on a single search
+    task = _open_bugs_cache['inflight'].get(project_key)
+    if task is None:
+        task = asyncio.ensure_future(_refresh_open_bug_priorities(project_key))
+        _open_bugs_cache['inflight'][project_key] = task
+    return await asyncio.shield(task)
+
+def count_bugs(priority_counts: Dict[str, int], priorities: Optional[List[str]] = None) -> int:
+    """
+    Count bugs from a priority count mapping
+
+    Args:
+        priority_counts: Mapping of priority name to number of bugs
+        priorities: Priority names to include, or None for every priority
+
+    Returns:
+        Number of bugs with the given priorities
+    """
+    if priorities is None:
+        return sum(priority_counts.values())
+    return sum(priority_counts.get(p, 0) for p in priorities)
+
+def summarize_bug_counts(priority_counts: Dict[str, int]) -> Dict[str, int]:
+    """
+    Derive the open bug counts used by the maturity criteria
+
+    Args:
+        priority_counts: Mapping of priority name to number of open bugs
+
+    Returns:
+        Dictionary with 'critical', 'medium_plus' and 'all' open bug counts
+    """
+    return {
+        'critical': count_bugs(priority_counts, CRITICAL_PRIORITIES),
+        'medium_plus': count_bugs(priority_counts, MEDIUM_PLUS_PRIORITIES),
+        'all': count_bugs(priority_counts)
+    }
+
+async def get_open_bug_counts(project_key: str) -> Optional[Dict[str, int]]:
+    """
+    Get the open bug counts used by the maturity criteria from a single search
+
+    Args:
+        project_key: The Jira project key
+
+    Returns:
+        Dictionary with 'critical', 'medium_plus' and 'all' open bug counts,
+        or None if Jira could not be queried
+    """
+    priority_counts = await get_open_bug_priority_counts(project_key)
+    if priority_counts is None:
+        return None
+    return summarize_bug_counts(priority_counts)
+
+async def get_portfolio_bug_index(project_keys: List[str]) -> Optional[Dict[str, Dict[str, int]]]:
+    """
+    Count open bugs by project and priority for many projects in one search
+
+    Args:
+        project_keys: Jira project keys to include
+
+    Returns:
+        Mapping of project key to priority counts, or None if the bulk search
+        failed (e.g. one of the projects does not exist in Jira)
+    """
+    if not project_keys:
+        return {}
+
+    if _is_bug_store_fresh() and all(key in _bug_store['projects'] for key in project_keys):
+        return {key: _bug_store['counts'].get(key, {}) for key in project_keys}
+
+    if not all([JIRA_URL, JIRA_USERNAME, JIRA_API_TOKEN]):
+        print("Missing Jira configuration")
+        return None
+
+    try:
+        jql = f'{_project_in(project_keys)} AND labels = "bug" AND status != "Done"'
+        issues = await _search_issues(jql, 'priority,project')
+
+        index = {key: {} for key in project_keys}
+        for issue in issues:
+            project = issue['fields'].get('project')
+            project_key = project['key'] if project else issue['key'].split('-')[0]
+            priority = issue['fields'].get('priority')
+            name = priority['name'] if priority else 'None'
+            counts = index.setdefault(project_key, {})
+            counts[name] = counts.get(name, 0) + 1
+
+        # Seed the per-project cache so the single-project functions reuse this sweep
+        now = time.time()
+        for project_key, counts in index.items():
+            _open_bugs_cache['data'][project_key] = {'counts': counts, 'timestamp': now}
+
+        print(f"Found {len(issues)} open bugs across {len(project_keys)} projects")
+        return index
+
+    except httpx.HTTPError as e:
+        print(f"Error fetching portfolio bugs from Jira: {e}")
+        return None
     except Exception as e:
         print(f"Unexpected error: {e}")
-        return 0
+        return None
+
+async def get_open_bugs_by_priority(project_key: str, priorities: List[str]) -> Optional[int]:
+    """
+    Get count of open bugs for specific priority levels
+    
+    Args:
+        project_key: The Jira project key
+        priorities: List of priority names (e.g., ['Highest', 'High'])
+    
+    Returns:
+        Number of open bugs with specified priorities, or None if Jira could not be queried
+    """
+    priority_counts = await get_open_bug_priority_counts(project_key)
+    if priority_counts is None:
+        return None
+
+    total_bugs = count_bugs(priority_counts, priorities)
+    print(f"Found {total_bugs} open bugs with priorities {priorities} in project {project_key}")
+    return total_bugs
 
-async def get_open_p1_bugs(project_key: str) -> int:
+async def get_open_p1_bugs(project_key: str) -> Optional[int]:
     """
     Get count of open P1 bugs for a specific project (backward compatibility)
     """
-    return await get_open_bugs_by_priority(project_key, ['Highest', 'High'])
+    return await get_open_bugs_by_priority(project_key, CRITICAL_PRIORITIES)
 
-async def get_open_all_bugs(project_key: str) -> int:
+async def get_open_all_bugs(project_key: str) -> Optional[int]:
     """
     Get count of all open bugs regardless of priority
     
@@ -138,42 +367,128 @@ async def get_open_all_bugs(project_key: str) -> int:
         project_key: The Jira project key
     
     Returns:
-        Number of all open bugs
+        Number of all open bugs, or None if Jira could not be queried
     """
-    if not all([JIRA_URL, JIRA_USERNAME, JIRA_API_TOKEN]):
-        print("Missing Jira configuration")
-        return 0
-    
+    priority_counts = await get_open_bug_priority_counts(project_key)
+    if priority_counts is None:
+        return None
+
+    total_bugs = count_bugs(priority_counts)
+    print(f"Found {total_bugs} total open bugs in project {project_key}")
+    return total_bugs
+
+def _project_in(project_keys: List[str]) -> str:
+    project_list = ", ".join(f'"{key}"' for key in project_keys)
+    return f'project in ({project_list})'
+
+def _is_bug_store_fresh() -> bool:
+    # A store that missed several sync cycles is no longer trusted
+    return time.time() - _bug_store['cursor'] < JIRA_SYNC_INTERVAL * 3
+
+def _to_stored_issue(issue: Dict) -> Dict:
+    fields = issue['fields']
+    project = fields.get('project')
+    return {
+        'key': issue['key'],
+        'project': project['key'] if project else issue['key'].split('-')[0],
+        'priority': fields['priority']['name'] if fields.get('priority') else 'None',
+        'status': fields['status']['name'] if fields.get('status') else None,
+        'labels': fields.get('labels', []),
+        'updated': fields.get('updated')
+    }
+
+def _rebuild_bug_store_counts():
+    counts = {key: {} for key in _bug_store['projects']}
+    for issue in _bug_store['issues'].values():
+        if issue['status'] == 'Done' or 'bug' not in issue['labels']:
+            continue
+        project_counts = counts.setdefault(issue['project'], {})
+        project_counts[issue['priority']] = project_counts.get(issue['priority'], 0) + 1
+    _bug_store['counts'] = counts
+
+async def sync_jira_bugs(project_keys: List[str], full: bool = False) -> bool:
+    """
+    Bring the local bug store up to date with Jira
+
+    Incremental syncs only ask for bugs updated since the last cursor and
+    upsert them; a full sync replaces the store to catch deleted issues and
+    removed labels.
+
+    Args:
+        project_keys: Jira project keys to keep in the store
+        full: Whether to run a full reconciliation
+
+    Returns:
+        True if the store was updated
+    """
+    if not project_keys or not all([JIRA_URL, JIRA_USERNAME, JIRA_API_TOKEN]):
+        return False
+
+    started_at = time.time()
+    full = (
+        full
+        or set(project_keys) != _bug_store['projects']
+        or started_at - _bug_store['last_full_sync'] >= JIRA_FULL_SYNC_INTERVAL
+    )
+
     try:
-        url = f"{JIRA_URL}/rest/api/3/search"
-        
-        # JQL for all open bugs
-        jql = f'project = "{project_key}" AND labels = "bug" AND status != "Done"'
-        
-        params = {
-            'jql': jql,
-            'maxResults': 0  # We only want the count
-        }
-        
-        headers = {
-            'Accept': 'application/json',
-            'Content-Type': 'application/json'
-        }
-        
-        auth = (JIRA_USERNAME, JIRA_API_TOKEN)
-        
-        response = requests.get(url, params=params, headers=headers, auth=auth)
-        response.raise_for_status()
-        
-        data = response.json()
-        total_bugs = data.get('total', 0)
-        
-        print(f"Found {total_bugs} total open bugs in project {project_key}")
-        return total_bugs
-        
-    except requests.exceptions.RequestException as e:
-        print(f"Error fetching all bugs from Jira: {e}")
-        return 0
+        if full:
+            jql = f'{_project_in(project_keys)} AND labels = "bug" AND status != "Done"'
+        else:
+            # Relative dates avoid any mismatch between our clock and the Jira user's timezone
+            minutes = math.ceil((started_at - _bug_store['cursor']) / 60) + JIRA_SYNC_OVERLAP_MINUTES
+            jql = f'{_project_in(project_keys)} AND labels = "bug" AND updated >= "-{minutes}m"'
+        issues = await _search_issues(jql, SYNC_FIELDS)
+    except httpx.HTTPError as e:
+        print(f"Error syncing bugs from Jira: {e}")
+        return False
     except Exception as e:
         print(f"Unexpected error: {e}")
-        return 0
\ No newline at end of file
+        return False
+
+    if full:
+        _bug_store['issues'] = {}
+        _bug_store['projects'] = set(project_keys)
+        _bug_store['last_full_sync'] = started_at
+
+    for issue in issues:
+        stored = _to_stored_issue(issue)
+        if stored['status'] == 'Done':
+            _bug_store['issues'].pop(stored['key'], None)
+        else:
+            _bug_store['issues'][stored['key']] = stored
+
+    _rebuild_bug_store_counts()
+    _bug_store['cursor'] = started_at
+
+    print(f"Jira {'full' if full else 'incremental'} sync applied {len(issues)} issues, {len(_bug_store['issues'])} open bugs stored")
+    return True
+
+def get_synced_bug_counts(project_key: str) -> Optional[Dict[str, int]]:
+    """
+    Get open bug counts by priority from the local bug store
+
+    Args:
+        project_key: The Jira project key
+
+    Returns:
+        Mapping of priority name to number of open bugs, or None if the store
+        does not cover the project or is not fresh
+    """
+    if project_key not in _bug_store['projects'] or not _is_bug_store_fresh():
+        return None
+    return _bug_store['counts'].get(project_key, {})
+
+async def run_jira_sync(get_project_keys: Callable[[], Awaitable[List[str]]]):
+    """
+    Keep the local bug store in sync until cancelled (started from the app lifespan)
+
+    Args:
+        get_project_keys: Returns the Jira project keys of the registered products
+    """
+    while True:
+        try:
+            await sync_jira_bugs(await get_project_keys())
+        except Exception as e:
+            print(f"Jira sync failed: {e}")
+        await asyncio.sleep(JIRA_SYNC_INTERVAL)
@@ -1,19 +1,64 @@
 import asyncio
-import requests
 import os
-from datetime import datetime
+from datetime import date, datetime, timedelta, timezone
 from dotenv import load_dotenv
+from typing import Dict, List, Optional, Tuple
+from services.cache import TTLCache
+from services.http_client import request
 
 load_dotenv()
 
 POSTHOG_API_KEY = os.getenv("POSTHOG_API_KEY")
-POSTHOG_PROJECT_ID = os.getenv("POSTHOG_PROJECT_ID", "191436")  
-POSTHOG_URL = os.getenv("POSTHOG_URL", "https://us.posthog.com")  
+POSTHOG_PROJECT_ID = os.getenv("POSTHOG_PROJECT_ID", "191436")
+POSTHOG_URL = os.getenv("POSTHOG_URL", "https://us.posthog.com")
 
 DATE_FROM = "2024-07-01"
-DATE_TO = datetime.now().strftime("%Y-%m-%d")
 
-async def get_active_users():
+# Event property whose values identify the products (e.g. host 'chorus.dooor.ai' -> 'chorus')
+POSTHOG_PRODUCT_PROPERTY = os.getenv("POSTHOG_PRODUCT_PROPERTY", "$host")
+POSTHOG_BREAKDOWN_LIMIT = 100
+
+# How long the count of the month in progress is reused before querying PostHog again
+POSTHOG_CACHE_TTL = int(os.getenv("POSTHOG_CACHE_TTL", "300"))
+
+# Monthly active users per product of months that are over; they never change again
+_closed_months: Dict[str, Dict[str, int]] = {}
+
+# Months still receiving events, re-queried once the TTL expires
+_open_months_cache = TTLCache(ttl=POSTHOG_CACHE_TTL)
+
+# Backfill query in flight per (missing months, today), shared by concurrent callers
+_backfills: Dict[Tuple[str, ...], asyncio.Task] = {}
+
+def _months_between(start: date, end: date) -> List[str]:
+    """Keys of every month from start to end, both included"""
+    months = []
+    year, month = start.year, start.month
+    while (year, month) <= (end.year, end.month):
+        months.append(f"{year:04d}-{month:02d}")
+        year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+    return months
+
+def product_from_breakdown_value(value) -> Optional[str]:
+    """
+    Product ID of a breakdown value (e.g., 'chorus.dooor.ai' -> 'chorus')
+
+    Hosts map to their first label; other property values are used as-is.
+    """
+    if value is None:
+        return None
+    value = str(value).strip().lower()
+    if POSTHOG_PRODUCT_PROPERTY == "$host":
+        value = value.split(":")[0].split(".")[0]
+    return value or None
+
+async def _query_monthly_active_users(date_from: str, date_to: str) -> Dict[str, Dict[str, int]]:
+    """
+    Run the monthly DAU TrendsQuery for a date range, broken down by product
+
+    Returns:
+        Mapping of month key ('YYYY-MM') to the active users of each product
+    """
     url = f"{POSTHOG_URL}/api/projects/{POSTHOG_PROJECT_ID}/query/"
     headers = {
         "Authorization": f"Bearer {POSTHOG_API_KEY}",
@@ -29,19 +74,107 @@ async def get_active_users():
                 }
             ],
             "dateRange": {
-                "date_from": DATE_FROM,
-                "date_to": DATE_TO
+                "date_from": date_from,
+                "date_to": date_to
             },
-            "interval": "month"
+            "interval": "month",
+            "breakdownFilter": {
+                "breakdown": POSTHOG_PRODUCT_PROPERTY,
+                "breakdown_type": "event",
+                "breakdown_limit": POSTHOG_BREAKDOWN_LIMIT
+            }
         }
     }
-    resp = requests.post(url, json=data, headers=headers)
+    resp = await request("posthog", "POST", url, json=data, headers=headers)
+    resp.raise_for_status()
     response_data = resp.json()
 
-    print(response_data)
-    
-    # Extract the user count from the response
-    if 'results' in response_data and len(response_data['results']) > 0:
-        return int(response_data['results'][0].get('count', 0))
-    return 0
-    
+    monthly = {}
+    for result in response_data.get('results') or []:
+        product_id = product_from_breakdown_value(result.get('breakdown_value'))
+        if product_id is None:
+            continue
+        for day, value in zip(result.get('days', []), result.get('data', [])):
+            # Several hosts can map to the same product
+            counts = monthly.setdefault(day[:7], {})
+            counts[product_id] = counts.get(product_id, 0) + int(value or 0)
+    return monthly
+
+async def _backfill_closed_months(key: Tuple[str, ...], missing: List[str], open_months: List[str], today: date) -> bool:
+    try:
+        # One query from the oldest missing month also covers the open months
+        monthly = await _query_monthly_active_users(f"{missing[0]}-01", today.isoformat())
+        for month in missing:
+            _closed_months[month] = monthly.get(month, {})
+        _open_months_cache.set(",".join(open_months), _sum_months(monthly, open_months))
+        return True
+    except Exception as e:
+        print(f"Error querying PostHog active users: {e}")
+        return False
+    finally:
+        _backfills.pop(key, None)
+
+def _sum_months(monthly: Dict[str, Dict[str, int]], months: List[str]) -> Dict[str, int]:
+    totals = {}
+    for month in months:
+        for product_id, count in monthly.get(month, {}).items():
+            totals[product_id] = totals.get(product_id, 0) + count
+    return totals
+
+async def get_active_users_by_product() -> Optional[Dict[str, int]]:
+    """
+    Get the active users since DATE_FROM (sum of the monthly DAU buckets) of
+    every product, with a single breakdown query
+
+    Closed months are queried once and kept; only the months still open are
+    queried again, at most every POSTHOG_CACHE_TTL seconds.
+
+    Returns:
+        Mapping of product ID to active users (products without events are
+        absent), or None if PostHog could not be queried
+    """
+    today = datetime.now(timezone.utc).date()
+    # The previous month stays open for a day so late events in other timezones still count
+    first_open = (today - timedelta(days=1)).replace(day=1)
+    closed = _months_between(date.fromisoformat(DATE_FROM), first_open - timedelta(days=1))
+    open_months = _months_between(first_open, today)
+    open_key = ",".join(open_months)
+
+    missing = [month for month in closed if month not in _closed_months]
+    if missing:
+        # Concurrent cold starts (the sweep and per-product calls) wait on the same query
+        key = (*missing, today.isoformat())
+        task = _backfills.get(key)
+        if task is None:
+            task = asyncio.ensure_future(_backfill_closed_months(key, missing, open_months, today))
+            _backfills[key] = task
+        if not await asyncio.shield(task):
+            return None
+
+    async def load_open_months():
+        monthly = await _query_monthly_active_users(first_open.isoformat(), today.isoformat())
+        return _sum_months(monthly, open_months)
+
+    open_users = await _open_months_cache.get(open_key, load_open_months)
+    if open_users is None:
+        return None
+
+    totals = _sum_months(_closed_months, closed)
+    for product_id, count in open_users.items():
+        totals[product_id] = totals.get(product_id, 0) + count
+    return totals
+
+async def get_active_users(product_id: str) -> Optional[int]:
+    """
+    Get the active users of one product since DATE_FROM
+
+    Args:
+        product_id: Product identifier (e.g., 'chorus')
+
+    Returns:
+        Number of active users, or None if PostHog could not be queried
+    """
+    users_by_product = await get_active_users_by_product()
+    if users_by_product is None:
+        return None
+    return users_by_product.get(product_id, 0)
@@ -0,0 +1,78 @@
+import httpx
+import os
+from dotenv import load_dotenv
+from typing import Dict, Optional
+from services.http_client import request, stream
+
+load_dotenv()
+
+# Default method for staging probes; products can override it with "probe_method"
+STAGING_PROBE_METHOD = os.getenv("STAGING_PROBE_METHOD", "HEAD").upper()
+PROBE_METHODS = ("HEAD", "GET")
+
+# Status codes servers use to reject HEAD requests
+HEAD_REJECTED_STATUSES = (405, 501)
+
+def get_staging_url(product_id: str) -> str:
+    """Staging URL of a product (e.g., 'chorus' -> https://chorus-staging.dooor.ai)"""
+    return f"https://{product_id}-staging.dooor.ai"
+
+async def _probe_get(url: str) -> httpx.Response:
+    # Read only the status line and headers; the body is never downloaded
+    async with stream("staging", "GET", url, follow_redirects=True) as resp:
+        return resp
+
+async def probe_url(url: str, method: Optional[str] = None) -> Dict:
+    """
+    Fetch a URL's status and headers once for the staging and security checks
+
+    HEAD is used by default and falls back to a GET when the server rejects
+    it; GET probes stream the response and close it after the headers.
+
+    Args:
+        url: The URL to probe
+        method: 'HEAD' or 'GET' (defaults to STAGING_PROBE_METHOD)
+
+    Returns:
+        Dictionary with 'url', 'status_code', 'headers' and 'method' of the
+        response, plus 'error' (None on success, status_code None on failure)
+    """
+    method = (method or STAGING_PROBE_METHOD).upper()
+    try:
+        if method == "HEAD":
+            resp = await request("staging", "HEAD", url, follow_redirects=True)
+            if resp.status_code in HEAD_REJECTED_STATUSES:
+                method = "GET"
+                resp = await _probe_get(url)
+        else:
+            resp = await _probe_get(url)
+
+        return {
+            "url": url,
+            "method": method,
+            "status_code": resp.status_code,
+            "headers": resp.headers,
+            "error": None
+        }
+    except Exception as e:
+        print(f"Error probing {url}: {e}")
+        return {
+            "url": url,
+            "method": method,
+            "status_code": None,
+            "headers": httpx.Headers(),
+            "error": str(e)
+        }
+
+async def probe_staging(product_id: str, method: Optional[str] = None) -> Dict:
+    """
+    Probe the staging URL of a product once per evaluation
+
+    Args:
+        product_id: Product identifier (e.g., 'chorus', 'cadence')
+        method: 'HEAD' or 'GET' (defaults to STAGING_PROBE_METHOD)
+
+    Returns:
+        Probe result as returned by probe_url
+    """
+    return await probe_url(get_staging_url(product_id), method)
@@ -0,0 +1,111 @@
+import asyncio
+import os
+import random
+import time
+import httpx
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from dotenv import load_dotenv
+from typing import Dict, Optional, Tuple
+
+load_dotenv()
+
+# Client-side quotas per vendor as (requests per minute, burst). Defaults follow the
+# documented limits: UptimeRobot free plan 10 req/min, PostHog query API 120 req/hour;
+# Jira Cloud has no fixed quota, so it gets a conservative pace
+RATE_LIMITS: Dict[str, Tuple[float, int]] = {
+    "jira": (float(os.getenv("JIRA_RATE_PER_MINUTE", "300")), int(os.getenv("JIRA_RATE_BURST", "10"))),
+    "uptime_robot": (float(os.getenv("UPTIMEROBOT_RATE_PER_MINUTE", "10")), int(os.getenv("UPTIMEROBOT_RATE_BURST", "10"))),
+    "posthog": (float(os.getenv("POSTHOG_RATE_PER_MINUTE", "2")), int(os.getenv("POSTHOG_RATE_BURST", "5"))),
+}
+
+# Retries of rate-limited or temporarily failing vendor requests
+RETRY_MAX_ATTEMPTS = int(os.getenv("RETRY_MAX_ATTEMPTS", "3"))
+RETRY_BASE_DELAY = float(os.getenv("RETRY_BASE_DELAY_SECONDS", "0.5"))
+RETRY_MAX_DELAY = float(os.getenv("RETRY_MAX_DELAY_SECONDS", "10"))
+RETRY_STATUSES = (429, 502, 503, 504)
+
+class TokenBucket:
+    """
+    Token bucket pacing the requests to one vendor
+
+    Holds up to `capacity` tokens, refilled at `rate` tokens per second;
+    each request takes one and waits for a refill when none is left.
+    """
+
+    def __init__(self, rate: float, capacity: int):
+        self.rate = rate
+        self.capacity = max(1, capacity)
+        self.tokens = float(self.capacity)
+        self.updated_at = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    async def acquire(self):
+        """Take one token, waiting until one is available"""
+        # Waiters are served in arrival order
+        async with self._lock:
+            self._refill()
+            if self.tokens < 1:
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+                self._refill()
+            self.tokens -= 1
+
+_buckets: Dict[str, TokenBucket] = {}
+
+async def acquire_token(service: str):
+    """Wait for the vendor's token bucket, if the service has a quota"""
+    limit = RATE_LIMITS.get(service)
+    if limit is None or limit[0] <= 0:
+        return
+    bucket = _buckets.get(service)
+    if bucket is None:
+        per_minute, burst = limit
+        bucket = TokenBucket(per_minute / 60, burst)
+        _buckets[service] = bucket
+    await bucket.acquire()
+
+def is_retryable(service: str) -> bool:
+    """Whether requests to the service are retried (vendor APIs only)"""
+    return service in RATE_LIMITS
+
+def _retry_after_seconds(response: httpx.Response) -> Optional[float]:
+    value = response.headers.get("retry-after")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+    return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+
+def backoff_delay(attempt: int, response: Optional[httpx.Response] = None) -> Optional[float]:
+    """
+    Delay before retrying after a failed attempt
+
+    Args:
+        attempt: Number of the attempt that failed, starting at 1
+        response: The failed response, if the server answered
+
+    Returns:
+        Seconds to wait (Retry-After when the server sent one, otherwise
+        full-jitter exponential backoff), or None when the server asks to
+        wait longer than RETRY_MAX_DELAY
+    """
+    retry_after = _retry_after_seconds(response) if response is not None else None
+    if retry_after is not None:
+        if retry_after > RETRY_MAX_DELAY:
+            return None
+        # A little jitter so clients told the same time do not all retry at once
+        return retry_after + random.uniform(0, RETRY_BASE_DELAY)
+    return random.uniform(0, min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2 ** (attempt - 1)))
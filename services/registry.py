@@ -0,0 +1,526 @@
+import asyncio
+import fcntl
+import glob
+import json
+import os
+import sqlite3
+import time
+from dotenv import load_dotenv
+from typing import Dict, List, Optional, Tuple
+
+load_dotenv()
+
+# Product registry (products, stages and observations)
+REGISTRY_DB = os.getenv("REGISTRY_DB", "registry.db")
+
+# JSON files used before the SQLite store; imported once into an empty database
+LEGACY_PRODUCTS_FILE = "products.json"
+LEGACY_STAGES_FILE = "product_stages.json"
+
+DEFAULT_PRODUCTS = {
+    "chorus": {"name": "Chorus", "description": "Main product"},
+    "cadence": {"name": "Cadence", "description": "Cadence product"},
+    "kenna": {"name": "Kenna", "description": "Kenna product"},
+    "duet": {"name": "Duet", "description": "Duet product"},
+    "nest": {"name": "Nest", "description": "Nest product"}
+}
+
+# Stage and observation updates are journaled and written to the database in batches.
+# Each process appends to its own '<REGISTRY_JOURNAL>.<pid>' file and holds a lock on it
+# while alive; journals left unlocked by a crashed process are replayed by the others
+REGISTRY_JOURNAL = os.getenv("REGISTRY_JOURNAL", f"{REGISTRY_DB}.journal")
+REGISTRY_FLUSH_INTERVAL = float(os.getenv("REGISTRY_FLUSH_INTERVAL_SECONDS", "2"))
+
+# Columns of the stages table that can be updated
+STAGE_FIELDS = ("stage", "observations")
+
+SCHEMA_VERSION = 2
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS products (
+    id TEXT PRIMARY KEY,
+    name TEXT NOT NULL,
+    description TEXT,
+    probe_method TEXT
+);
+CREATE TABLE IF NOT EXISTS stages (
+    product_id TEXT PRIMARY KEY,
+    stage TEXT,
+    observations TEXT,
+    stage_updated_at INTEGER,
+    observations_updated_at INTEGER
+) WITHOUT ROWID;
+"""
+
+# Version 1 had no write times
+_MIGRATIONS = {
+    2: """
+ALTER TABLE stages ADD COLUMN stage_updated_at INTEGER;
+ALTER TABLE stages ADD COLUMN observations_updated_at INTEGER;
+"""
+}
+
+_initialized = False
+
+# In-memory copy of the registry; reads are dict lookups until the database file changes
+_registry = {
+    'signature': None,
+    'products': None,
+    'stages': None,
+    # Write time of each (product_id, field) in 'stages', as in the database
+    'stamps': None
+}
+_registry_lock = asyncio.Lock()
+
+# Journaled stage updates not yet written to the database, oldest first
+_pending_updates: List[Dict] = []
+_journal_lock = asyncio.Lock()
+
+# This process's journal file, opened and locked on first use
+_journal = {
+    'pid': None,
+    'file': None,
+    'last_stamp': 0
+}
+
+def _read_legacy_json(path: str) -> Dict:
+    if not os.path.exists(path):
+        return {}
+    with open(path, 'r') as f:
+        return json.load(f) or {}
+
+def _migrate_legacy_files(conn: sqlite3.Connection):
+    products = _read_legacy_json(LEGACY_PRODUCTS_FILE) or DEFAULT_PRODUCTS
+    conn.executemany(
+        "INSERT OR IGNORE INTO products (id, name, description, probe_method) VALUES (?, ?, ?, ?)",
+        [
+            (product_id, info.get("name", product_id), info.get("description"), info.get("probe_method"))
+            for product_id, info in products.items()
+        ]
+    )
+
+    rows = []
+    for product_id, data in _read_legacy_json(LEGACY_STAGES_FILE).items():
+        # Old format: {"product": "stage"}
+        if isinstance(data, str):
+            data = {"stage": data}
+        rows.append((product_id, data.get("stage"), data.get("observations")))
+    conn.executemany("INSERT OR IGNORE INTO stages (product_id, stage, observations) VALUES (?, ?, ?)", rows)
+    print(f"Imported {len(products)} products and {len(rows)} stages into {REGISTRY_DB}")
+
+def _connect() -> sqlite3.Connection:
+    global _initialized
+    conn = sqlite3.connect(REGISTRY_DB)
+    if not _initialized:
+        conn.execute("PRAGMA journal_mode=WAL")
+        with conn:
+            # Take the write lock first so only one process runs the migration
+            conn.execute("BEGIN IMMEDIATE")
+            version = conn.execute("PRAGMA user_version").fetchone()[0]
+            if version < SCHEMA_VERSION:
+                if version == 0:
+                    scripts = [_SCHEMA]
+                else:
+                    scripts = [_MIGRATIONS[v] for v in range(version + 1, SCHEMA_VERSION + 1)]
+                for script in scripts:
+                    for statement in script.split(";"):
+                        if statement.strip():
+                            conn.execute(statement)
+                if version == 0:
+                    _migrate_legacy_files(conn)
+                conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+        # Updates journaled by crashed processes are applied before anything reads
+        _replay_orphaned_journals(conn)
+        _initialized = True
+    return conn
+
+def _product_from_row(row) -> Dict:
+    _, name, description, probe_method = row
+    product = {"name": name, "description": description}
+    if probe_method:
+        product["probe_method"] = probe_method
+    return product
+
+def _list_products() -> Dict[str, Dict]:
+    conn = _connect()
+    try:
+        rows = conn.execute("SELECT id, name, description, probe_method FROM products ORDER BY rowid").fetchall()
+        return {row[0]: _product_from_row(row) for row in rows}
+    finally:
+        conn.close()
+
+def _list_stages() -> Tuple[Dict[str, Dict], Dict[Tuple[str, str], int]]:
+    conn = _connect()
+    try:
+        stages, stamps = {}, {}
+        rows = conn.execute(
+            "SELECT product_id, stage, observations, stage_updated_at, observations_updated_at FROM stages"
+        )
+        for product_id, stage, observations, stage_updated_at, observations_updated_at in rows:
+            data = {}
+            if stage is not None:
+                data["stage"] = stage
+            if observations is not None:
+                data["observations"] = observations
+            stages[product_id] = data
+            for column, updated_at in (("stage", stage_updated_at), ("observations", observations_updated_at)):
+                if updated_at is not None:
+                    stamps[(product_id, column)] = updated_at
+        return stages, stamps
+    finally:
+        conn.close()
+
+def _create_product(product_id: str, product: Dict) -> bool:
+    conn = _connect()
+    try:
+        with conn:
+            cursor = conn.execute(
+                "INSERT OR IGNORE INTO products (id, name, description, probe_method) VALUES (?, ?, ?, ?)",
+                (product_id, product["name"], product.get("description"), product.get("probe_method"))
+            )
+            return cursor.rowcount == 1
+    finally:
+        conn.close()
+
+def _delete_product(product_id: str) -> Optional[Dict]:
+    conn = _connect()
+    try:
+        with conn:
+            row = conn.execute(
+                "SELECT id, name, description, probe_method FROM products WHERE id = ?", (product_id,)
+            ).fetchone()
+            if row is None:
+                return None
+            # The product and its stage go away together or not at all
+            conn.execute("DELETE FROM products WHERE id = ?", (product_id,))
+            conn.execute("DELETE FROM stages WHERE product_id = ?", (product_id,))
+            return _product_from_row(row)
+    finally:
+        conn.close()
+
+def _upsert_stage(conn: sqlite3.Connection, update: Dict):
+    product_id, fields = update["product_id"], update["fields"]
+    # Entries journaled before write times existed are applied as of now
+    updated_at = update.get("updated_at") or _next_stamp()
+    for column in STAGE_FIELDS:
+        if column not in fields:
+            continue
+        # Only this product's row is written, only if the product is registered, and a
+        # field never goes back to an older value (e.g. a crashed worker's journal
+        # replayed after a newer update was flushed)
+        conn.execute(
+            f"""
+            INSERT INTO stages (product_id, {column}, {column}_updated_at)
+            SELECT id, ?, ? FROM products WHERE id = ?
+            ON CONFLICT (product_id) DO UPDATE SET {column} = excluded.{column}, {column}_updated_at = excluded.{column}_updated_at
+            WHERE excluded.{column}_updated_at > COALESCE(stages.{column}_updated_at, -1)
+            """,
+            (fields[column], updated_at, product_id)
+        )
+
+def _next_stamp() -> int:
+    # Wall clock in nanoseconds, comparable across workers, and increasing within this one
+    stamp = max(time.time_ns(), _journal['last_stamp'] + 1)
+    _journal['last_stamp'] = stamp
+    return stamp
+
+def _journal_file():
+    if _journal['pid'] != os.getpid():
+        if _journal['file'] is not None:
+            # Inherited from the parent on fork; the parent keeps its own journal
+            _journal['file'].close()
+        f = open(f"{REGISTRY_JOURNAL}.{os.getpid()}", 'a+')
+        # Held until the process exits, so other processes know the journal is live
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        _journal.update(pid=os.getpid(), file=f)
+    return _journal['file']
+
+def _append_journal(updates: List[Dict]):
+    f = _journal_file()
+    for update in updates:
+        f.write(json.dumps(update) + "\n")
+    f.flush()
+    os.fsync(f.fileno())
+
+def _truncate_journal():
+    f = _journal_file()
+    f.truncate(0)
+    f.flush()
+    os.fsync(f.fileno())
+
+def _read_journal(f) -> List[Dict]:
+    f.seek(0)
+    updates = []
+    for line in f:
+        try:
+            updates.append(json.loads(line))
+        except ValueError:
+            # A line cut short by a crash was never acknowledged
+            break
+    return updates
+
+def _other_journals() -> List[str]:
+    own = _journal['file'].name if _journal['pid'] == os.getpid() else None
+    # Also matches the single journal of older versions
+    return [path for path in sorted(glob.glob(f"{glob.escape(REGISTRY_JOURNAL)}*")) if path != own]
+
+def _replay_orphaned_journals(conn: sqlite3.Connection):
+    """
+    Apply and delete the journals of processes that are gone
+
+    Journals still locked by their process are left alone. Runs in a write
+    transaction, so processes starting together replay each journal once.
+    """
+    opened, replayed = [], []
+    try:
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            for path in _other_journals():
+                try:
+                    f = open(path, 'r')
+                except FileNotFoundError:
+                    continue
+                opened.append(f)
+                try:
+                    fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    continue
+                # Already replayed and deleted by another process
+                if os.fstat(f.fileno()).st_nlink == 0:
+                    continue
+                updates = _read_journal(f)
+                for update in updates:
+                    _upsert_stage(conn, update)
+                if updates:
+                    print(f"Replayed {len(updates)} journaled stage updates from {path}")
+                replayed.append(path)
+        # Deleted only once the replayed updates are committed
+        for path in replayed:
+            os.remove(path)
+    finally:
+        for f in opened:
+            f.close()
+
+def _write_stage_updates(updates: List[Dict]):
+    conn = _connect()
+    try:
+        # One transaction for the whole batch, then the journal is no longer needed
+        with conn:
+            for update in updates:
+                _upsert_stage(conn, update)
+        _truncate_journal()
+    finally:
+        conn.close()
+
+def _reclaim_orphaned_journals():
+    if not _other_journals():
+        return
+    conn = _connect()
+    try:
+        _replay_orphaned_journals(conn)
+    finally:
+        conn.close()
+
+def _file_signature(path: str) -> Optional[Tuple[int, int, int]]:
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (st.st_ino, st.st_mtime_ns, st.st_size)
+
+def _db_signature() -> Tuple:
+    # Writes land in the WAL file first and reach the main file on checkpoints
+    return (_file_signature(REGISTRY_DB), _file_signature(f"{REGISTRY_DB}-wal"))
+
+def _load_registry() -> Tuple[Tuple, Dict[str, Dict], Dict[str, Dict], Dict[Tuple[str, str], int]]:
+    _connect().close()
+    # Taken before reading, so a write landing during the read triggers another reload
+    signature = _db_signature()
+    return (signature, _list_products(), *_list_stages())
+
+async def _get_registry() -> Dict:
+    """
+    Get the in-memory registry, reloading it only when the database changed
+    outside this process (e.g. another worker or a manual edit)
+    """
+    if _registry['products'] is not None and _registry['signature'] == _db_signature():
+        return _registry
+    async with _registry_lock:
+        if _registry['products'] is None or _registry['signature'] != _db_signature():
+            signature, products, stages, stamps = await asyncio.to_thread(_load_registry)
+            # Updates still waiting for the flusher, unless the database has newer values
+            loaded = {'stages': stages, 'stamps': stamps}
+            for update in _pending_updates:
+                _apply_stage_fields(loaded, update)
+            _registry.update(signature=signature, products=products, stages=stages, stamps=stamps)
+    return _registry
+
+def _apply_stage_fields(registry: Dict, update: Dict):
+    # Same rule as _upsert_stage: the most recently written value of each field wins
+    product_id, fields, updated_at = update["product_id"], update["fields"], update["updated_at"]
+    data = registry['stages'].setdefault(product_id, {})
+    for column in STAGE_FIELDS:
+        if column in fields and updated_at > registry['stamps'].get((product_id, column), -1):
+            registry['stamps'][(product_id, column)] = updated_at
+            data[column] = fields[column]
+            if fields[column] is None:
+                data.pop(column)
+
+def _mark_written():
+    # Our own writes are applied to the cache directly instead of reloading it
+    _registry['signature'] = _db_signature()
+
+async def list_products() -> Dict[str, Dict]:
+    """
+    Get all registered products in creation order
+
+    Returns:
+        Mapping of product ID to its 'name', 'description' and optional 'probe_method'
+    """
+    registry = await _get_registry()
+    return {product_id: dict(product) for product_id, product in registry['products'].items()}
+
+async def list_product_ids() -> List[str]:
+    """Get the IDs of all registered products in creation order"""
+    return list((await _get_registry())['products'].keys())
+
+async def get_product(product_id: str) -> Optional[Dict]:
+    """Get a registered product, or None if it does not exist"""
+    product = (await _get_registry())['products'].get(product_id)
+    return dict(product) if product is not None else None
+
+async def list_stages() -> Dict[str, Dict]:
+    """
+    Get the stage and observations of every product that has any
+
+    Returns:
+        Mapping of product ID to a dict with 'stage' and/or 'observations'
+    """
+    registry = await _get_registry()
+    return {product_id: dict(data) for product_id, data in registry['stages'].items()}
+
+async def get_stage(product_id: str) -> Dict:
+    """Get the stage and observations of a product (empty dict if none)"""
+    return dict((await _get_registry())['stages'].get(product_id, {}))
+
+async def create_product(product_id: str, product: Dict) -> bool:
+    """
+    Register a new product
+
+    Args:
+        product_id: Product identifier
+        product: Dict with 'name' and optional 'description' and 'probe_method'
+
+    Returns:
+        True if created, False if a product with this ID already exists
+    """
+    registry = await _get_registry()
+    created = await asyncio.to_thread(_create_product, product_id, product)
+    if created:
+        registry['products'][product_id] = _product_from_row(
+            (product_id, product["name"], product.get("description"), product.get("probe_method"))
+        )
+        _mark_written()
+    return created
+
+async def delete_product(product_id: str) -> Optional[Dict]:
+    """
+    Delete a product together with its stage and observations
+
+    Returns:
+        The deleted product, or None if it did not exist
+    """
+    # Pending stage updates must not outlive the product they belong to
+    await flush_stage_updates()
+    registry = await _get_registry()
+    deleted = await asyncio.to_thread(_delete_product, product_id)
+    if deleted is not None:
+        registry['products'].pop(product_id, None)
+        registry['stages'].pop(product_id, None)
+        for column in STAGE_FIELDS:
+            registry['stamps'].pop((product_id, column), None)
+        _mark_written()
+    return deleted
+
+async def update_stage_fields(product_id: str, **fields) -> bool:
+    """
+    Update the stage and/or observations of one product
+
+    The update is visible immediately and durable once this returns (it is
+    appended to the journal); the database is written by the flusher.
+
+    Args:
+        product_id: Product identifier
+        **fields: 'stage' and/or 'observations' values to store
+
+    Returns:
+        True if updated, False if the product is not registered
+    """
+    if not any(column in fields for column in STAGE_FIELDS):
+        raise ValueError(f"Nothing to update, expected one of {', '.join(STAGE_FIELDS)}")
+    return (await update_stage_fields_bulk([(product_id, fields)]))[0]
+
+async def update_stage_fields_bulk(updates: List[Tuple[str, Dict]]) -> List[bool]:
+    """
+    Update the stage and/or observations of many products with one journal write
+
+    Items for unknown products or without any stage field are skipped; the
+    others are applied in order, so a later item wins over an earlier one.
+
+    Args:
+        updates: (product_id, fields) pairs, fields holding 'stage' and/or 'observations'
+
+    Returns:
+        Whether each item was applied, in the same order
+    """
+    registry = await _get_registry()
+    applied = []
+    accepted = []
+    for product_id, fields in updates:
+        fields = {k: v for k, v in fields.items() if k in STAGE_FIELDS}
+        ok = product_id in registry['products'] and bool(fields)
+        applied.append(ok)
+        if ok:
+            accepted.append({"product_id": product_id, "fields": fields})
+
+    if accepted:
+        async with _journal_lock:
+            # Stamped in journal order; replays and other workers compare these write times
+            for update in accepted:
+                update["updated_at"] = _next_stamp()
+            await asyncio.to_thread(_append_journal, accepted)
+            _pending_updates.extend(accepted)
+        for update in accepted:
+            _apply_stage_fields(registry, update)
+    return applied
+
+async def flush_stage_updates() -> int:
+    """
+    Write all journaled stage updates to the database in one transaction
+
+    Returns:
+        Number of updates written
+    """
+    async with _journal_lock:
+        if not _pending_updates:
+            return 0
+        updates = list(_pending_updates)
+        await asyncio.to_thread(_write_stage_updates, updates)
+        del _pending_updates[:len(updates)]
+        _mark_written()
+        return len(updates)
+
+async def run_registry_flusher():
+    """
+    Flush journaled stage updates every REGISTRY_FLUSH_INTERVAL seconds, and
+    replay journals left by crashed processes, until cancelled (started from
+    the app lifespan)
+    """
+    while True:
+        await asyncio.sleep(REGISTRY_FLUSH_INTERVAL)
+        try:
+            await flush_stage_updates()
+            # Pick up journals of workers that crashed since this one started
+            await asyncio.to_thread(_reclaim_orphaned_journals)
+        except Exception as e:
+            print(f"Registry flush failed: {e}")
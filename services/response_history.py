@@ -0,0 +1,186 @@
+import asyncio
+import math
+import os
+import sqlite3
+import time
+from dotenv import load_dotenv
+from typing import Dict, List, Optional
+
+load_dotenv()
+
+# Local time-series store of UptimeRobot response times
+RESPONSE_HISTORY_DB = os.getenv("RESPONSE_HISTORY_DB", "response_history.db")
+RAW_RETENTION_DAYS = int(os.getenv("RESPONSE_HISTORY_RAW_DAYS", "35"))
+HOURLY_RETENTION_DAYS = int(os.getenv("RESPONSE_HISTORY_HOURLY_DAYS", "180"))
+
+# When set, the latency criteria use this many days of history instead of the latest UptimeRobot samples
+LATENCY_WINDOW_DAYS = int(os.getenv("LATENCY_WINDOW_DAYS", "0"))
+
+HOUR = 3600
+DAY = 86400
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS response_samples (
+    monitor TEXT NOT NULL,
+    ts INTEGER NOT NULL,
+    value REAL NOT NULL,
+    PRIMARY KEY (monitor, ts)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS response_rollups (
+    monitor TEXT NOT NULL,
+    resolution INTEGER NOT NULL,
+    bucket INTEGER NOT NULL,
+    count INTEGER NOT NULL,
+    total REAL NOT NULL,
+    min REAL NOT NULL,
+    max REAL NOT NULL,
+    PRIMARY KEY (monitor, resolution, bucket)
+) WITHOUT ROWID;
+"""
+
+_initialized = False
+
+def _connect() -> sqlite3.Connection:
+    global _initialized
+    conn = sqlite3.connect(RESPONSE_HISTORY_DB)
+    if not _initialized:
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript(_SCHEMA)
+        _initialized = True
+    return conn
+
+def _record_samples(samples: Dict[str, List[Dict]]) -> int:
+    now = int(time.time())
+    inserted = 0
+    conn = _connect()
+    try:
+        with conn:
+            for monitor, response_times in samples.items():
+                rows = [
+                    (monitor, int(rt['datetime']), float(rt['value']))
+                    for rt in response_times
+                    if rt.get('datetime') and rt.get('value')
+                ]
+                if not rows:
+                    continue
+
+                # Samples already stored are skipped, so overlapping refreshes never duplicate data
+                before = conn.total_changes
+                conn.executemany("INSERT OR IGNORE INTO response_samples VALUES (?, ?, ?)", rows)
+                if conn.total_changes == before:
+                    continue
+                inserted += conn.total_changes - before
+
+                # Rebuild the hourly rollups touched by this batch from raw samples,
+                # then the daily rollups from the hourly ones
+                first_hour = min(ts for _, ts, _ in rows) // HOUR * HOUR
+                conn.execute(
+                    """
+                    INSERT OR REPLACE INTO response_rollups
+                    SELECT monitor, ?, ts / ? * ?, COUNT(*), SUM(value), MIN(value), MAX(value)
+                    FROM response_samples WHERE monitor = ? AND ts >= ?
+                    GROUP BY ts / ?
+                    """,
+                    (HOUR, HOUR, HOUR, monitor, first_hour, HOUR)
+                )
+                first_day = first_hour // DAY * DAY
+                conn.execute(
+                    """
+                    INSERT OR REPLACE INTO response_rollups
+                    SELECT monitor, ?, bucket / ? * ?, SUM(count), SUM(total), MIN(min), MAX(max)
+                    FROM response_rollups WHERE monitor = ? AND resolution = ? AND bucket >= ?
+                    GROUP BY bucket / ?
+                    """,
+                    (DAY, DAY, DAY, monitor, HOUR, first_day, DAY)
+                )
+
+            # Raw samples and hourly rollups expire; daily rollups are kept
+            conn.execute("DELETE FROM response_samples WHERE ts < ?", (now - RAW_RETENTION_DAYS * DAY,))
+            conn.execute(
+                "DELETE FROM response_rollups WHERE resolution = ? AND bucket < ?",
+                (HOUR, now - HOURLY_RETENTION_DAYS * DAY)
+            )
+    finally:
+        conn.close()
+    return inserted
+
+def _window_stats(monitor: str, days: int) -> Optional[Dict]:
+    since = int(time.time()) - days * DAY
+    conn = _connect()
+    try:
+        if days <= RAW_RETENTION_DAYS:
+            count, total, minimum, maximum = conn.execute(
+                "SELECT COUNT(*), SUM(value), MIN(value), MAX(value) FROM response_samples WHERE monitor = ? AND ts >= ?",
+                (monitor, since)
+            ).fetchone()
+        else:
+            # Older than the raw retention: aggregate the daily rollups
+            count, total, minimum, maximum = conn.execute(
+                "SELECT SUM(count), SUM(total), MIN(min), MAX(max) FROM response_rollups WHERE monitor = ? AND resolution = ? AND bucket >= ?",
+                (monitor, DAY, since // DAY * DAY)
+            ).fetchone()
+
+        if not count:
+            return None
+
+        def percentile(q: float) -> Optional[float]:
+            if days > RAW_RETENTION_DAYS:
+                return None
+            # Same sample NumPy's 'higher' method picks, read by offset instead of loading the window
+            offset = math.ceil(q * (count - 1))
+            row = conn.execute(
+                "SELECT value FROM response_samples WHERE monitor = ? AND ts >= ? ORDER BY value LIMIT 1 OFFSET ?",
+                (monitor, since, offset)
+            ).fetchone()
+            return row[0] if row else None
+
+        return {
+            'friendly_name': monitor,
+            'window_days': days,
+            'average_ms': round(total / count, 2),
+            'min_ms': minimum,
+            'max_ms': maximum,
+            'p95_ms': percentile(0.95),
+            'p99_ms': percentile(0.99),
+            'sample_count': count
+        }
+    finally:
+        conn.close()
+
+async def record_response_times(monitors: List[Dict]):
+    """
+    Append the response time samples of fetched monitors to the history store
+
+    Args:
+        monitors: Monitors returned by the UptimeRobot API with response times
+    """
+    samples = {
+        monitor.get('friendly_name'): monitor.get('response_times') or []
+        for monitor in monitors
+        if monitor.get('friendly_name')
+    }
+    try:
+        inserted = await asyncio.to_thread(_record_samples, samples)
+        print(f"Stored {inserted} new response time samples")
+    except Exception as e:
+        print(f"Error storing response time history: {e}")
+
+async def get_response_time_window_stats(friendly_name: str, days: int = 7) -> Optional[Dict]:
+    """
+    Get latency statistics for a monitor over the last `days` days of stored history
+
+    Windows within the raw retention are computed from every stored sample;
+    longer windows use the daily rollups and have no percentiles.
+
+    Args:
+        friendly_name: The friendly name of the monitor (e.g., 'chorus')
+        days: Window length in days
+
+    Returns:
+        Dictionary with response time statistics or None if no history/error
+    """
+    try:
+        return await asyncio.to_thread(_window_stats, friendly_name, days)
+    except Exception as e:
+        print(f"Error reading response time history for {friendly_name}: {e}")
+        return None
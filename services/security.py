@@ -1,6 +1,98 @@
-import httpx
-import asyncio
-from typing import Dict, Optional, List
+from typing import Dict, Optional
+from services.probe import probe_staging, probe_url
+
+ESSENTIAL_HEADERS = [
+    "Strict-Transport-Security",
+    "X-Content-Type-Options", 
+    "X-Frame-Options"
+]
+
+def has_essential_security_headers(probe: Dict) -> bool:
+    """
+    Check a probe result for the essential security headers
+    
+    Args:
+        probe: Probe result from services.probe
+    
+    Returns:
+        True if all essential security headers are present
+    """
+    if probe["error"]:
+        return False
+    return all(h in probe["headers"] for h in ESSENTIAL_HEADERS)
+
+def build_security_report(probe: Dict) -> Optional[Dict]:
+    """
+    Build the detailed security header report from a probe result
+    
+    Args:
+        probe: Probe result from services.probe
+    
+    Returns:
+        Dictionary with security header status and details, or None if the probe failed
+    """
+    if probe["error"]:
+        return None
+
+    url = probe["url"]
+    status_code = probe["status_code"]
+    headers = probe["headers"]
+
+    security_headers = {
+        "Strict-Transport-Security": {
+            "present": "Strict-Transport-Security" in headers,
+            "value": headers.get("Strict-Transport-Security", ""),
+            "description": "Enforces HTTPS connections"
+        },
+        "X-Content-Type-Options": {
+            "present": "X-Content-Type-Options" in headers,
+            "value": headers.get("X-Content-Type-Options", ""),
+            "description": "Prevents MIME type sniffing"
+        },
+        "X-Frame-Options": {
+            "present": "X-Frame-Options" in headers,
+            "value": headers.get("X-Frame-Options", ""),
+            "description": "Prevents clickjacking attacks"
+        },
+        "Content-Security-Policy": {
+            "present": "Content-Security-Policy" in headers,
+            "value": headers.get("Content-Security-Policy", ""),
+            "description": "Controls resource loading"
+        },
+        "X-XSS-Protection": {
+            "present": "X-XSS-Protection" in headers,
+            "value": headers.get("X-XSS-Protection", ""),
+            "description": "XSS attack protection"
+        },
+        "Referrer-Policy": {
+            "present": "Referrer-Policy" in headers,
+            "value": headers.get("Referrer-Policy", ""),
+            "description": "Controls referrer information"
+        }
+    }
+
+    # Calculate security score
+    total_headers = len(security_headers)
+    present_headers = sum(1 for h in security_headers.values() if h["present"])
+    essential_headers = ESSENTIAL_HEADERS
+    essential_present = sum(1 for name in essential_headers if security_headers[name]["present"])
+
+    result = {
+        "url": url,
+        "status_code": status_code,
+        "headers": security_headers,
+        "summary": {
+            "total_headers_checked": total_headers,
+            "headers_present": present_headers,
+            "essential_headers_present": essential_present,
+            "essential_headers_total": len(essential_headers),
+            "security_score": round((present_headers / total_headers) * 100, 1),
+            "essential_security_passed": essential_present == len(essential_headers)
+        }
+    }
+
+    print(f"Security check for {url}: {present_headers}/{total_headers} headers present")
+    return result
 
 async def check_security_headers(url: str) -> bool:
     """
@@ -12,21 +104,7 @@ async def check_security_headers(url: str) -> bool:
     Returns:
         True if all essential security headers are present
     """
-    try:
-        async with httpx.AsyncClient(timeout=10.0) as client:
-            resp = await client.get(url)
-            headers = resp.headers
-
-            required_headers = [
-                "Strict-Transport-Security",
-                "X-Content-Type-Options", 
-                "X-Frame-Options"
-            ]
-
-            return all(h in headers for h in required_headers)
-    except Exception as e:
-        print(f"Error checking security headers for {url}: {e}")
-        return False
+    return has_essential_security_headers(await probe_url(url))
 
 async def check_security_headers_detailed(url: str) -> Optional[Dict]:
     """
@@ -38,93 +116,30 @@ async def check_security_headers_detailed(url: str) -> Optional[Dict]:
     Returns:
         Dictionary with security header status and details
     """
-    try:
-        async with httpx.AsyncClient(timeout=10.0) as client:
-            resp = await client.get(url)
-            headers = resp.headers
-
-            security_headers = {
-                "Strict-Transport-Security": {
-                    "present": "Strict-Transport-Security" in headers,
-                    "value": headers.get("Strict-Transport-Security", ""),
-                    "description": "Enforces HTTPS connections"
-                },
-                "X-Content-Type-Options": {
-                    "present": "X-Content-Type-Options" in headers,
-                    "value": headers.get("X-Content-Type-Options", ""),
-                    "description": "Prevents MIME type sniffing"
-                },
-                "X-Frame-Options": {
-                    "present": "X-Frame-Options" in headers,
-                    "value": headers.get("X-Frame-Options", ""),
-                    "description": "Prevents clickjacking attacks"
-                },
-                "Content-Security-Policy": {
-                    "present": "Content-Security-Policy" in headers,
-                    "value": headers.get("Content-Security-Policy", ""),
-                    "description": "Controls resource loading"
-                },
-                "X-XSS-Protection": {
-                    "present": "X-XSS-Protection" in headers,
-                    "value": headers.get("X-XSS-Protection", ""),
-                    "description": "XSS attack protection"
-                },
-                "Referrer-Policy": {
-                    "present": "Referrer-Policy" in headers,
-                    "value": headers.get("Referrer-Policy", ""),
-                    "description": "Controls referrer information"
-                }
-            }
-
-            # Calculate security score
-            total_headers = len(security_headers)
-            present_headers = sum(1 for h in security_headers.values() if h["present"])
-            essential_headers = ["Strict-Transport-Security", "X-Content-Type-Options", "X-Frame-Options"]
-            essential_present = sum(1 for name in essential_headers if security_headers[name]["present"])
-
-            result = {
-                "url": url,
-                "status_code": resp.status_code,
-                "headers": security_headers,
-                "summary": {
-                    "total_headers_checked": total_headers,
-                    "headers_present": present_headers,
-                    "essential_headers_present": essential_present,
-                    "essential_headers_total": len(essential_headers),
-                    "security_score": round((present_headers / total_headers) * 100, 1),
-                    "essential_security_passed": essential_present == len(essential_headers)
-                }
-            }
-
-            print(f"Security check for {url}: {present_headers}/{total_headers} headers present")
-            return result
-
-    except Exception as e:
-        print(f"Error checking security headers for {url}: {e}")
-        return None
+    return build_security_report(await probe_url(url))
 
-async def check_product_security(product_id: str) -> bool:
+async def check_product_security(product_id: str, probe: Dict = None) -> bool:
     """
     Check security headers for a specific product
     
     Args:
         product_id: Product identifier (e.g., 'chorus', 'cadence')
+        probe: Staging probe already made for this evaluation, if any
     
     Returns:
         True if all essential security headers are present
     """
-    staging_url = f"https://{product_id}-staging.dooor.ai"
-    return await check_security_headers(staging_url)
+    return has_essential_security_headers(probe or await probe_staging(product_id))
 
-async def check_product_security_detailed(product_id: str) -> Optional[Dict]:
+async def check_product_security_detailed(product_id: str, probe: Dict = None) -> Optional[Dict]:
     """
     Get detailed security information for a specific product
     
     Args:
         product_id: Product identifier (e.g., 'chorus', 'cadence')
+        probe: Staging probe already made for this evaluation, if any
     
     Returns:
         Dictionary with detailed security header information
     """
-    staging_url = f"https://{product_id}-staging.dooor.ai"
-    return await check_security_headers_detailed(staging_url)
\ No newline at end of file
+    return build_security_report(probe or await probe_staging(product_id))
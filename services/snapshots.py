@@ -0,0 +1,71 @@
+import asyncio
+import os
+from dotenv import load_dotenv
+from typing import Awaitable, Callable, Dict, List, Optional
+
+load_dotenv()
+
+# Background recomputation of the maturity evaluations
+SNAPSHOT_ENABLED = os.getenv("SNAPSHOT_ENABLED", "true").lower() == "true"
+SNAPSHOT_INTERVAL = int(os.getenv("SNAPSHOT_INTERVAL_SECONDS", "120"))
+
+# Latest evaluation per product, served by the maturity endpoints
+_snapshot = {
+    'products': {},
+    'inflight': None
+}
+
+def store_evaluation(result: Dict):
+    """Store the latest evaluation of one product"""
+    _snapshot['products'][result['id']] = result
+
+def get_snapshot_product(product_id: str) -> Optional[Dict]:
+    """Get the latest stored evaluation of a product, if any"""
+    return _snapshot['products'].get(product_id)
+
+def discard_snapshot_product(product_id: str):
+    """Forget a product's stored evaluation (e.g. after it is deleted)"""
+    _snapshot['products'].pop(product_id, None)
+
+async def _run_refresh(refresh: Callable[[], Awaitable[List[Dict]]]) -> List[Dict]:
+    try:
+        results = await refresh()
+        for result in results:
+            store_evaluation(result)
+        return results
+    finally:
+        _snapshot['inflight'] = None
+
+async def refresh_snapshot(refresh: Callable[[], Awaitable[List[Dict]]]) -> List[Dict]:
+    """
+    Recompute every product and store the results
+
+    A refresh already running (scheduled or forced) is shared instead of
+    starting another one.
+
+    Args:
+        refresh: Coroutine function evaluating all registered products
+
+    Returns:
+        The fresh evaluations
+    """
+    task = _snapshot['inflight']
+    if task is None:
+        task = asyncio.ensure_future(_run_refresh(refresh))
+        _snapshot['inflight'] = task
+    return await asyncio.shield(task)
+
+async def run_snapshot_scheduler(refresh: Callable[[], Awaitable[List[Dict]]]):
+    """
+    Refresh the snapshot every SNAPSHOT_INTERVAL seconds until cancelled
+    (started from the app lifespan)
+
+    Args:
+        refresh: Coroutine function evaluating all registered products
+    """
+    while True:
+        try:
+            await refresh_snapshot(refresh)
+        except Exception as e:
+            print(f"Snapshot refresh failed: {e}")
+        await asyncio.sleep(SNAPSHOT_INTERVAL)
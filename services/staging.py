@@ -1,10 +1,10 @@
-import requests
+from typing import Dict
+from services.probe import probe_url
+
+
+def is_staging_alive(probe: Dict) -> bool:
+    return probe["status_code"] == 200 or probe["status_code"] == 307
 
 
 async def check_staging_alive(url: str) -> bool:
-    try:
-        res = requests.get(url, timeout=3.0)
-        print(res)
-        return res.status_code == 200 or res.status_code == 307
-    except Exception:
-        return False
+    return is_staging_alive(await probe_url(url))
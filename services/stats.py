@@ -0,0 +1,132 @@
+import os
+import numpy as np
+from dotenv import load_dotenv
+from typing import Dict, List, Optional, Tuple
+
+load_dotenv()
+
+# NumPy percentile method; 'higher' picks the same sample as indexing the
+# sorted values at int(q * n)
+PERCENTILE_METHODS = (
+    "linear", "lower", "higher", "nearest", "midpoint",
+    "inverted_cdf", "averaged_inverted_cdf", "closest_observation",
+    "interpolated_inverted_cdf", "hazen", "weibull", "median_unbiased", "normal_unbiased"
+)
+PERCENTILE_METHOD = os.getenv("RESPONSE_TIME_PERCENTILE_METHOD", "higher")
+
+def _percentile_positions(counts: np.ndarray, q: float, method: str) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Positions in each sorted row that a percentile reads, as np.percentile
+    computes them for each method
+
+    Args:
+        counts: Number of samples of each row
+        q: Percentile as a fraction (e.g. 0.95)
+        method: One of PERCENTILE_METHODS
+
+    Returns:
+        Lower and upper sample index of each row and the weight of the upper one
+    """
+    n = counts.astype(float)
+    if method in ("lower", "higher", "nearest"):
+        rounding = {"lower": np.floor, "higher": np.ceil, "nearest": np.around}[method]
+        index = rounding((n - 1) * q).astype(np.intp)
+        return index, index, np.zeros_like(n)
+    if method in ("inverted_cdf", "closest_observation"):
+        # Discrete methods: the lower sample on an exact position (odd one for closest_observation), else the upper
+        virtual = n * q - 1 if method == "inverted_cdf" else n * q - 1.5
+        previous = np.floor(virtual)
+        exact = virtual == previous
+        if method == "closest_observation":
+            exact &= previous % 2 == 1
+        index = np.maximum(np.where(exact, previous, previous + 1), 0).astype(np.intp)
+        return index, index, np.zeros_like(n)
+
+    if method == "linear":
+        virtual = (n - 1) * q
+    elif method == "midpoint":
+        virtual = 0.5 * (np.floor((n - 1) * q) + np.ceil((n - 1) * q))
+    elif method == "averaged_inverted_cdf":
+        virtual = n * q - 1
+    else:
+        # Hyndman & Fan (alpha, beta) plotting positions
+        alpha, beta = {
+            "interpolated_inverted_cdf": (0, 1),
+            "hazen": (0.5, 0.5),
+            "weibull": (0, 0),
+            "median_unbiased": (1 / 3.0, 1 / 3.0),
+            "normal_unbiased": (3 / 8.0, 3 / 8.0),
+        }[method]
+        virtual = n * q + (alpha + q * (1 - alpha - beta)) - 1
+
+    previous = np.floor(virtual)
+    gamma = virtual - previous
+    if method == "averaged_inverted_cdf":
+        gamma = np.where(gamma == 0, 0.5, 1.0)
+    elif method == "midpoint":
+        gamma = np.where(virtual % 1 == 0, 0.0, 0.5)
+    lower = previous.astype(np.intp)
+    upper = lower + 1
+    # Positions past either end read the first or last sample
+    above = virtual >= n - 1
+    below = virtual < 0
+    lower[above] = upper[above] = counts[above] - 1
+    lower[below] = upper[below] = 0
+    return lower, upper, gamma
+
+def _batched_percentile(sorted_matrix: np.ndarray, counts: np.ndarray, q: float, method: str) -> np.ndarray:
+    lower, upper, gamma = _percentile_positions(counts, q, method)
+    a = np.take_along_axis(sorted_matrix, lower[:, None], axis=1)[:, 0]
+    b = np.take_along_axis(sorted_matrix, upper[:, None], axis=1)[:, 0]
+    # Interpolated from the nearer end, as NumPy does, so results match it exactly
+    return np.where(gamma >= 0.5, b - (b - a) * (1 - gamma), a + (b - a) * gamma)
+
+def compute_response_time_stats(series: Dict[str, List[float]], method: str = None) -> Dict[str, Optional[Dict]]:
+    """
+    Compute latency statistics for many monitors in one vectorized pass
+
+    Args:
+        series: Mapping of monitor name to its response time samples in ms
+        method: NumPy percentile interpolation method (defaults to PERCENTILE_METHOD)
+
+    Returns:
+        Mapping of monitor name to a dictionary with 'average_ms', 'min_ms',
+        'max_ms', 'p95_ms', 'p99_ms' and 'sample_count', or None when the
+        monitor has no samples
+    """
+    method = method or PERCENTILE_METHOD
+    if method not in PERCENTILE_METHODS:
+        raise ValueError(f"Unknown percentile method: {method}")
+
+    result = {name: None for name in series}
+    names = [name for name, values in series.items() if len(values) > 0]
+    if not names:
+        return result
+
+    # Pad the ragged series into one matrix; NaN marks missing samples
+    width = max(len(series[name]) for name in names)
+    matrix = np.full((len(names), width), np.nan)
+    for row, name in enumerate(names):
+        values = series[name]
+        matrix[row, :len(values)] = values
+
+    counts = np.count_nonzero(~np.isnan(matrix), axis=1)
+    averages = np.nanmean(matrix, axis=1)
+    minimums = np.nanmin(matrix, axis=1)
+    maximums = np.nanmax(matrix, axis=1)
+    # NaN padding sorts to the end of each row, so a row's samples are its first `counts` entries
+    sorted_matrix = np.sort(matrix, axis=1)
+    p95 = _batched_percentile(sorted_matrix, counts, 0.95, method)
+    p99 = _batched_percentile(sorted_matrix, counts, 0.99, method)
+
+    for row, name in enumerate(names):
+        result[name] = {
+            'average_ms': round(float(averages[row]), 2),
+            'min_ms': float(minimums[row]),
+            'max_ms': float(maximums[row]),
+            'p95_ms': round(float(p95[row]), 2),
+            'p99_ms': round(float(p99[row]), 2),
+            'sample_count': int(counts[row])
+        }
+
+    return result
@@ -1,45 +1,43 @@
-import requests
+import httpx
 import os
-import time
 from dotenv import load_dotenv
 from typing import Dict, Optional, List
+from services.cache import TTLCache
+from services.http_client import request
+from services.stats import compute_response_time_stats
+from services.response_history import record_response_times
 
 load_dotenv()
 
 UPTIMEROBOT_API_KEY = os.getenv("UPTIMEROBOT_API_KEY")
 UPTIMEROBOT_URL = "https://api.uptimerobot.com/v2"
 
-# Cache for storing monitors data to avoid repeated API calls
-_monitors_cache = {
-    'data': None,
-    'timestamp': 0,
-    'ttl': 300  # 5 minutes cache TTL
-}
+# Cache for storing monitors data to avoid repeated API calls. Each key has its
+# own timestamp, concurrent misses share one API call, and entries up to
+# UPTIMEROBOT_STALE_TTL seconds past the TTL are served while a refresh runs.
+_monitors_cache = TTLCache(
+    ttl=int(os.getenv("UPTIMEROBOT_CACHE_TTL", "300")),  # 5 minutes cache TTL
+    stale_ttl=int(os.getenv("UPTIMEROBOT_STALE_TTL", "600"))
+)
 
-async def _get_all_monitors(include_response_times: bool = False) -> Optional[List[Dict]]:
+async def _get_monitor_index(include_response_times: bool = False) -> Optional[Dict]:
     """
-    Get all monitors from UptimeRobot API with caching to reduce API calls
+    Get all monitors from UptimeRobot API, indexed, with caching to reduce API calls
     
     Args:
         include_response_times: Whether to include response time data
     
     Returns:
-        List of monitors or None if error
+        Monitor index built by _build_monitor_index or None if error
     """
     if not UPTIMEROBOT_API_KEY:
         print("Missing UptimeRobot API key")
         return None
     
-    current_time = time.time()
     cache_key = f"monitors_rt_{include_response_times}"
-    
-    # Check if we have valid cached data
-    if (_monitors_cache['data'] is not None and 
-        cache_key in _monitors_cache['data'] and
-        current_time - _monitors_cache['timestamp'] < _monitors_cache['ttl']):
-        print("Using cached UptimeRobot data")
-        return _monitors_cache['data'][cache_key]
-    
+    return await _monitors_cache.get(cache_key, lambda: _fetch_monitor_index(include_response_times))
+
+async def _fetch_monitor_index(include_response_times: bool) -> Optional[Dict]:
     try:
         monitors_url = f"{UPTIMEROBOT_URL}/getMonitors"
         
@@ -56,7 +54,7 @@ async def _get_all_monitors(include_response_times: bool = False) -> Optional[Li
         else:
             params['response_times'] = '0'
         
-        response = requests.post(monitors_url, data=params)
+        response = await request("uptime_robot", "POST", monitors_url, data=params)
         response.raise_for_status()
         
         data = response.json()
@@ -67,24 +65,69 @@ async def _get_all_monitors(include_response_times: bool = False) -> Optional[Li
         
         monitors = data.get('monitors', [])
         
-        # Initialize cache data structure if needed
-        if _monitors_cache['data'] is None:
-            _monitors_cache['data'] = {}
+        print(f"Fetched {len(monitors)} monitors from UptimeRobot API")
         
-        # Cache the result
-        _monitors_cache['data'][cache_key] = monitors
-        _monitors_cache['timestamp'] = current_time
+        # Keep the samples beyond UptimeRobot's short response time window
+        if include_response_times:
+            await record_response_times(monitors)
         
-        print(f"Fetched {len(monitors)} monitors from UptimeRobot API")
-        return monitors
+        # Index once per refresh
+        return _build_monitor_index(monitors)
         
-    except requests.exceptions.RequestException as e:
+    except httpx.HTTPError as e:
         print(f"Error fetching monitors from UptimeRobot: {e}")
         return None
     except Exception as e:
         print(f"Unexpected error: {e}")
         return None
 
+def _monitor_uptime(monitor: Dict) -> float:
+    # 30-day uptime ratio, falling back to the all-time ratio if custom ratios are not available
+    custom_uptime_ratio = monitor.get('custom_uptime_ratio')
+    if custom_uptime_ratio:
+        return float(custom_uptime_ratio)
+    return float(monitor.get('all_time_uptime_ratio', 0))
+
+def _build_monitor_index(monitors: List[Dict]) -> Dict:
+    """
+    Index monitors by friendly name and URL with uptime and latency stats precomputed
+    
+    Args:
+        monitors: Monitors returned by the UptimeRobot API
+    
+    Returns:
+        Dictionary with the raw 'monitors' list and 'by_name' / 'by_url' lookups
+        of {'monitor', 'uptime', 'response_times'} entries
+    """
+    # Latency stats for every monitor in one vectorized batch
+    series = {
+        position: [rt.get('value', 0) for rt in monitor.get('response_times') or [] if rt.get('value')]
+        for position, monitor in enumerate(monitors)
+    }
+    stats = compute_response_time_stats(series)
+    
+    by_name = {}
+    by_url = {}
+    for position, monitor in enumerate(monitors):
+        friendly_name = monitor.get('friendly_name')
+        response_times = None
+        if stats[position]:
+            response_times = {
+                'friendly_name': friendly_name,
+                **stats[position],
+                'raw_data': monitor['response_times'][-10:]  # Last 10 data points
+            }
+        entry = {
+            'monitor': monitor,
+            'uptime': _monitor_uptime(monitor),
+            'response_times': response_times
+        }
+        # Keep the first monitor for duplicated names or URLs, as the linear scans did
+        by_name.setdefault(friendly_name, entry)
+        by_url.setdefault(monitor.get('url'), entry)
+    
+    return {'monitors': monitors, 'by_name': by_name, 'by_url': by_url}
+
 async def get_monitor_uptime_by_url(monitor_url: str) -> Optional[float]:
     """
     Get uptime percentage for a specific monitor URL
@@ -95,33 +138,17 @@ async def get_monitor_uptime_by_url(monitor_url: str) -> Optional[float]:
     Returns:
         Uptime percentage (0-100) or None if not found/error
     """
-    monitors = await _get_all_monitors(include_response_times=False)
-    if not monitors:
+    index = await _get_monitor_index(include_response_times=False)
+    if not index:
         return None
     
-    # Find monitor matching the URL
-    target_monitor = None
-    for monitor in monitors:
-        if monitor.get('url') == monitor_url:
-            target_monitor = monitor
-            break
-    
-    if not target_monitor:
+    entry = index['by_url'].get(monitor_url)
+    if not entry:
         print(f"Monitor not found for URL: {monitor_url}")
         return None
     
-    # Extract uptime ratio (30-day)
-    custom_uptime_ratio = target_monitor.get('custom_uptime_ratio')
-    if custom_uptime_ratio:
-        uptime_percentage = float(custom_uptime_ratio)
-        print(f"Uptime for {monitor_url}: {uptime_percentage}%")
-        return uptime_percentage
-    
-    # Fallback to all-time ratio if custom ratios not available
-    all_time_uptime = target_monitor.get('all_time_uptime_ratio', 0)
-    uptime_percentage = float(all_time_uptime)
-    print(f"All-time uptime for {monitor_url}: {uptime_percentage}%")
-    return uptime_percentage
+    print(f"Uptime for {monitor_url}: {entry['uptime']}%")
+    return entry['uptime']
 
 async def get_monitor_uptime(friendly_name: str) -> Optional[float]:
     """
@@ -133,33 +160,17 @@ async def get_monitor_uptime(friendly_name: str) -> Optional[float]:
     Returns:
         Uptime percentage (0-100) or None if not found/error
     """
-    monitors = await _get_all_monitors(include_response_times=False)
-    if not monitors:
+    index = await _get_monitor_index(include_response_times=False)
+    if not index:
         return None
     
-    # Find monitor matching the friendly name
-    target_monitor = None
-    for monitor in monitors:
-        if monitor.get('friendly_name') == friendly_name:
-            target_monitor = monitor
-            break
-    
-    if not target_monitor:
+    entry = index['by_name'].get(friendly_name)
+    if not entry:
         print(f"Monitor not found for friendly name: {friendly_name}")
         return None
     
-    # Extract uptime ratio (30-day)
-    custom_uptime_ratio = target_monitor.get('custom_uptime_ratio')
-    if custom_uptime_ratio:
-        uptime_percentage = float(custom_uptime_ratio)
-        print(f"Uptime for {friendly_name}: {uptime_percentage}%")
-        return uptime_percentage
-    
-    # Fallback to all-time ratio if custom ratios not available
-    all_time_uptime = target_monitor.get('all_time_uptime_ratio', 0)
-    uptime_percentage = float(all_time_uptime)
-    print(f"All-time uptime for {friendly_name}: {uptime_percentage}%")
-    return uptime_percentage
+    print(f"Uptime for {friendly_name}: {entry['uptime']}%")
+    return entry['uptime']
 
 async def get_monitor_response_times(friendly_name: str) -> Optional[Dict]:
     """
@@ -171,58 +182,20 @@ async def get_monitor_response_times(friendly_name: str) -> Optional[Dict]:
     Returns:
         Dictionary with response time data or None if not found/error
     """
-    monitors = await _get_all_monitors(include_response_times=True)
-    if not monitors:
+    index = await _get_monitor_index(include_response_times=True)
+    if not index:
         return None
     
-    # Find monitor matching the friendly name
-    target_monitor = None
-    for monitor in monitors:
-        if monitor.get('friendly_name') == friendly_name:
-            target_monitor = monitor
-            break
-    
-    if not target_monitor:
+    entry = index['by_name'].get(friendly_name)
+    if not entry:
         print(f"Monitor not found for friendly name: {friendly_name}")
         return None
     
-    # Extract response times
-    response_times = target_monitor.get('response_times', [])
-    
-    if not response_times:
+    result = entry['response_times']
+    if not result:
         print(f"No response time data available for {friendly_name}")
         return None
     
-    # Process response times to get statistics
-    values = [rt.get('value', 0) for rt in response_times if rt.get('value')]
-    
-    if not values:
-        return None
-    
-    avg_response_time = sum(values) / len(values)
-    min_response_time = min(values)
-    max_response_time = max(values)
-    
-    # Sort values to get percentiles
-    sorted_values = sorted(values)
-    n = len(sorted_values)
-    p95_index = int(0.95 * n)
-    p99_index = int(0.99 * n)
-    
-    p95_response_time = sorted_values[min(p95_index, n-1)]
-    p99_response_time = sorted_values[min(p99_index, n-1)]
-    
-    result = {
-        'friendly_name': friendly_name,
-        'average_ms': round(avg_response_time, 2),
-        'min_ms': min_response_time,
-        'max_ms': max_response_time,
-        'p95_ms': p95_response_time,
-        'p99_ms': p99_response_time,
-        'sample_count': len(values),
-        'raw_data': response_times[-10:]  # Last 10 data points
-    }
-    
     print(f"Response times for {friendly_name}: Avg={result['average_ms']}ms, P95={result['p95_ms']}ms")
     return result
 
@@ -250,7 +223,7 @@ async def get_product_response_times(product_id: str) -> Optional[Dict]:
     """
     return await get_monitor_response_times(product_id)
 
-async def get_all_products_data(product_ids: List[str]) -> Dict[str, Dict]:
+async def get_all_products_data(product_ids: List[str]) -> Optional[Dict[str, Dict]]:
     """
     Get both uptime and response time data for multiple products in a single API call
     
@@ -259,70 +232,38 @@ async def get_all_products_data(product_ids: List[str]) -> Dict[str, Dict]:
     
     Returns:
         Dictionary mapping product_id to their uptime and response time data
+        (both None when the product has no monitor), or None if UptimeRobot
+        could not be queried
     """
     # Fetch monitors with response times (this includes uptime data too)
-    monitors = await _get_all_monitors(include_response_times=True)
-    if not monitors:
-        return {}
+    index = await _get_monitor_index(include_response_times=True)
+    if not index:
+        return None
     
     result = {}
     
     for product_id in product_ids:
-        # Find monitor for this product
-        target_monitor = None
-        for monitor in monitors:
-            if monitor.get('friendly_name') == product_id:
-                target_monitor = monitor
-                break
+        entry = index['by_name'].get(product_id)
         
-        if not target_monitor:
+        if not entry:
             print(f"Monitor not found for product: {product_id}")
             result[product_id] = {'uptime': None, 'response_times': None}
             continue
         
-        # Get uptime
-        uptime = None
-        custom_uptime_ratio = target_monitor.get('custom_uptime_ratio')
-        if custom_uptime_ratio:
-            uptime = float(custom_uptime_ratio)
-        else:
-            all_time_uptime = target_monitor.get('all_time_uptime_ratio', 0)
-            uptime = float(all_time_uptime)
-        
-        # Get response times
-        response_times_data = None
-        response_times = target_monitor.get('response_times', [])
-        if response_times:
-            values = [rt.get('value', 0) for rt in response_times if rt.get('value')]
-            if values:
-                avg_response_time = sum(values) / len(values)
-                sorted_values = sorted(values)
-                n = len(sorted_values)
-                p95_index = int(0.95 * n)
-                p95_response_time = sorted_values[min(p95_index, n-1)]
-                
-                response_times_data = {
-                    'friendly_name': product_id,
-                    'average_ms': round(avg_response_time, 2),
-                    'min_ms': min(values),
-                    'max_ms': max(values),
-                    'p95_ms': p95_response_time,
-                    'p99_ms': sorted_values[min(int(0.99 * n), n-1)],
-                    'sample_count': len(values)
-                }
+        response_times_data = entry['response_times']
+        if response_times_data:
+            response_times_data = {k: v for k, v in response_times_data.items() if k != 'raw_data'}
         
         result[product_id] = {
-            'uptime': uptime,
+            'uptime': entry['uptime'],
             'response_times': response_times_data
         }
         
-        print(f"Data for {product_id}: uptime={uptime}%, avg_response={response_times_data['average_ms'] if response_times_data else 'N/A'}ms")
+        print(f"Data for {product_id}: uptime={entry['uptime']}%, avg_response={response_times_data['average_ms'] if response_times_data else 'N/A'}ms")
     
     return result
 
 def clear_uptime_cache():
     """Clear the UptimeRobot cache to force fresh data on next request"""
-    global _monitors_cache
-    _monitors_cache['data'] = None
-    _monitors_cache['timestamp'] = 0
-    print("UptimeRobot cache cleared")
\ No newline at end of file
+    _monitors_cache.invalidate()
+    print("UptimeRobot cache cleared")
@@ -0,0 +1,98 @@
+import asyncio
+
+from services.cache import TTLCache
+
+class CountingLoader:
+    """Loader returning 'value-<n>' on its n-th call, after an optional delay"""
+
+    def __init__(self, delay: float = 0):
+        self.delay = delay
+        self.calls = 0
+
+    async def __call__(self):
+        self.calls += 1
+        calls = self.calls
+        await asyncio.sleep(self.delay)
+        return f"value-{calls}"
+
+def _age(cache: TTLCache, key, seconds: float):
+    cache._entries[key]['timestamp'] -= seconds
+
+def test_per_key_timestamps():
+    """Each key expires on its own timestamp"""
+    async def run():
+        cache = TTLCache(ttl=60)
+        first, second = CountingLoader(), CountingLoader()
+        assert await cache.get("first", first) == "value-1"
+        assert await cache.get("second", second) == "value-1"
+
+        _age(cache, "first", 61)
+        assert await cache.get("first", first) == "value-2"
+        assert await cache.get("second", second) == "value-1"
+        assert (first.calls, second.calls) == (2, 1)
+
+    asyncio.run(run())
+    print("[OK] Keys expire independently")
+
+def test_single_flight_on_concurrent_misses():
+    """Concurrent misses for a key share one load"""
+    async def run():
+        cache = TTLCache(ttl=60)
+        loader = CountingLoader(delay=0.05)
+        results = await asyncio.gather(*[cache.get("key", loader) for _ in range(10)])
+        assert results == ["value-1"] * 10
+        assert loader.calls == 1
+
+        # Other keys are loaded separately
+        other = CountingLoader(delay=0.05)
+        await asyncio.gather(cache.get("key", loader), cache.get("other", other), cache.get("other", other))
+        assert (loader.calls, other.calls) == (1, 1)
+
+    asyncio.run(run())
+    print("[OK] Concurrent misses share a single load")
+
+def test_stale_while_revalidate():
+    """Expired entries within stale_ttl are served at once while one refresh runs"""
+    async def run():
+        cache = TTLCache(ttl=60, stale_ttl=120)
+        loader = CountingLoader(delay=0.05)
+        await cache.get("key", loader)
+
+        _age(cache, "key", 90)
+        stale = await asyncio.gather(*[cache.get("key", loader) for _ in range(5)])
+        assert stale == ["value-1"] * 5
+        assert loader.calls == 2
+
+        await asyncio.sleep(0.1)
+        assert await cache.get("key", loader) == "value-2"
+        assert loader.calls == 2
+
+        # Past stale_ttl the caller waits for a fresh value
+        _age(cache, "key", 200)
+        assert await cache.get("key", loader) == "value-3"
+
+    asyncio.run(run())
+    print("[OK] Stale entries are served while a single refresh runs")
+
+def test_failed_refresh_keeps_stale_value():
+    async def run():
+        cache = TTLCache(ttl=60, stale_ttl=120)
+        await cache.get("key", CountingLoader())
+        _age(cache, "key", 90)
+
+        async def failing():
+            raise RuntimeError("upstream down")
+
+        assert await cache.get("key", failing) == "value-1"
+        await asyncio.sleep(0)
+        assert await cache.get("key", failing) == "value-1"
+        assert cache.peek("key") is None
+
+    asyncio.run(run())
+    print("[OK] A failed refresh keeps serving the stale value")
+
+if __name__ == "__main__":
+    test_per_key_timestamps()
+    test_single_flight_on_concurrent_misses()
+    test_stale_while_revalidate()
+    test_failed_refresh_keeps_stale_value()
@@ -0,0 +1,143 @@
+import asyncio
+import time
+
+from services import circuit_breaker, http_client
+from services.circuit_breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, CircuitOpenError
+
+def _fail(breaker: CircuitBreaker, times: int):
+    for _ in range(times):
+        breaker.before_call()
+        breaker.record_failure("HTTP 503")
+
+def _rejected(breaker: CircuitBreaker) -> bool:
+    try:
+        breaker.before_call()
+    except CircuitOpenError:
+        return True
+    return False
+
+def _expire(breaker: CircuitBreaker):
+    # As if reset_timeout had passed since the circuit opened
+    breaker.opened_at = time.monotonic() - breaker.reset_timeout - 1
+
+def test_opens_at_threshold():
+    breaker = CircuitBreaker("test", failure_threshold=3, reset_timeout=30)
+    _fail(breaker, 2)
+    assert breaker.state == CLOSED
+
+    # A success resets the count of consecutive failures
+    breaker.before_call()
+    breaker.record_success()
+    _fail(breaker, 2)
+    assert breaker.state == CLOSED
+
+    _fail(breaker, 1)
+    assert breaker.state == OPEN
+    try:
+        breaker.before_call()
+    except CircuitOpenError as e:
+        assert e.name == "test" and 29 < e.retry_after <= 30
+    else:
+        raise AssertionError("an open circuit let a call through")
+
+    print("[OK] Circuit opens after failure_threshold consecutive failures")
+
+def test_half_open_success_closes():
+    breaker = CircuitBreaker("test", failure_threshold=1, reset_timeout=30)
+    _fail(breaker, 1)
+    _expire(breaker)
+
+    breaker.before_call()
+    assert breaker.state == HALF_OPEN
+    breaker.record_success()
+    assert breaker.state == CLOSED
+    assert breaker.failures == 0
+    assert not _rejected(breaker)
+
+    print("[OK] Successful trial call closes a half-open circuit")
+
+def test_half_open_failure_reopens():
+    breaker = CircuitBreaker("test", failure_threshold=5, reset_timeout=30)
+    _fail(breaker, 5)
+    _expire(breaker)
+
+    # A single failed trial is enough, whatever the threshold
+    _fail(breaker, 1)
+    assert breaker.state == OPEN
+    assert _rejected(breaker)
+
+    print("[OK] Failed trial call reopens a half-open circuit")
+
+def test_half_open_max_calls():
+    breaker = CircuitBreaker("test", failure_threshold=1, reset_timeout=30, half_open_max_calls=2)
+    _fail(breaker, 1)
+    _expire(breaker)
+
+    assert not _rejected(breaker)
+    assert not _rejected(breaker)
+    assert _rejected(breaker)
+    assert breaker.state == HALF_OPEN
+
+    print("[OK] Half-open circuit lets half_open_max_calls trial calls through")
+
+def test_release_on_cancellation():
+    breaker = CircuitBreaker("test", failure_threshold=1, reset_timeout=30)
+    _fail(breaker, 1)
+    _expire(breaker)
+
+    breaker.before_call()
+    assert _rejected(breaker)
+
+    # The trial call was cancelled: no verdict, and another trial may go
+    breaker.release()
+    assert breaker.state == HALF_OPEN
+    assert not _rejected(breaker)
+
+    print("[OK] Released trial call frees its half-open slot without a verdict")
+
+def test_cancelled_request_releases_trial():
+    """A trial call cancelled inside http_client gives its half-open slot back"""
+    async def run():
+        circuit_breaker._breakers.clear()
+        breaker = circuit_breaker.get_circuit_breaker("jira")
+        breaker.failure_threshold = 1
+        _fail(breaker, 1)
+        _expire(breaker)
+
+        async def hung_call():
+            async with http_client._guarded("jira", "vendor.example"):
+                await asyncio.sleep(60)
+
+        task = asyncio.ensure_future(hung_call())
+        await asyncio.sleep(0)
+        assert _rejected(breaker)
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        assert breaker.state == HALF_OPEN
+        assert not _rejected(breaker)
+
+    asyncio.run(run())
+    circuit_breaker._breakers.clear()
+    print("[OK] Cancelled trial request frees its half-open slot")
+
+def test_snapshot():
+    breaker = CircuitBreaker("test", failure_threshold=1, reset_timeout=30)
+    assert breaker.snapshot() == {
+        "state": CLOSED, "consecutive_failures": 0, "retry_in_seconds": None, "last_error": None
+    }
+    _fail(breaker, 1)
+    snapshot = breaker.snapshot()
+    assert snapshot["state"] == OPEN
+    assert snapshot["last_error"] == "HTTP 503"
+    assert 0 < snapshot["retry_in_seconds"] <= 30
+
+    print("[OK] Snapshot reports state, failures and time until the next trial")
+
+if __name__ == "__main__":
+    test_opens_at_threshold()
+    test_half_open_success_closes()
+    test_half_open_failure_reopens()
+    test_half_open_max_calls()
+    test_release_on_cancellation()
+    test_cancelled_request_releases_trial()
+    test_snapshot()
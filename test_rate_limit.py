@@ -0,0 +1,186 @@
+import asyncio
+import time
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime
+from unittest import mock
+
+import httpx
+
+from services import circuit_breaker, http_client, rate_limit
+from services.circuit_breaker import CircuitOpenError
+from services.rate_limit import TokenBucket, backoff_delay
+
+def _reset():
+    rate_limit._buckets.clear()
+    circuit_breaker._breakers.clear()
+
+def test_bucket_refill():
+    """Tokens come back at `rate` per second, up to `capacity`"""
+    bucket = TokenBucket(rate=10, capacity=5)
+    bucket.tokens = 0
+    bucket.updated_at -= 0.3
+    bucket._refill()
+    assert abs(bucket.tokens - 3) < 0.01
+
+    bucket.updated_at -= 60
+    bucket._refill()
+    assert bucket.tokens == 5
+
+    print("[OK] Token bucket refills at its rate up to its capacity")
+
+def test_bucket_wait_time():
+    """The burst goes through at once, then each request waits for one token"""
+    async def run():
+        bucket = TokenBucket(rate=2, capacity=3)
+        delays = []
+
+        async def fake_sleep(delay):
+            delays.append(delay)
+            # As if the wait had passed
+            bucket.updated_at -= delay
+
+        with mock.patch("asyncio.sleep", fake_sleep):
+            for _ in range(3):
+                await bucket.acquire()
+            assert delays == []
+            await bucket.acquire()
+        assert len(delays) == 1 and abs(delays[0] - 0.5) < 0.01
+
+    asyncio.run(run())
+    print("[OK] Token bucket serves the burst, then waits 1/rate per request")
+
+def test_retry_after_seconds():
+    response = httpx.Response(429, headers={"Retry-After": "3"})
+    delay = backoff_delay(1, response)
+    assert 3 <= delay <= 3 + rate_limit.RETRY_BASE_DELAY
+
+    print("[OK] Retry-After in seconds is honoured")
+
+def test_retry_after_http_date():
+    retry_at = datetime.now(timezone.utc) + timedelta(seconds=5)
+    response = httpx.Response(503, headers={"Retry-After": format_datetime(retry_at, usegmt=True)})
+    delay = backoff_delay(1, response)
+    # The header has whole seconds only
+    assert 3.9 <= delay <= 5 + rate_limit.RETRY_BASE_DELAY
+
+    past = format_datetime(datetime.now(timezone.utc) - timedelta(minutes=1), usegmt=True)
+    delay = backoff_delay(1, httpx.Response(429, headers={"Retry-After": past}))
+    assert 0 <= delay <= rate_limit.RETRY_BASE_DELAY
+
+    print("[OK] Retry-After as an HTTP date is honoured")
+
+def test_retry_after_over_max_delay():
+    response = httpx.Response(429, headers={"Retry-After": str(rate_limit.RETRY_MAX_DELAY + 1)})
+    assert backoff_delay(1, response) is None
+
+    print("[OK] Retry-After beyond RETRY_MAX_DELAY gives up")
+
+def test_backoff_without_retry_after():
+    for attempt in range(1, 10):
+        delay = backoff_delay(attempt)
+        assert 0 <= delay <= min(rate_limit.RETRY_MAX_DELAY, rate_limit.RETRY_BASE_DELAY * 2 ** (attempt - 1))
+
+    print("[OK] Backoff without Retry-After is capped exponential jitter")
+
+def _request_with(handler, service: str = "jira") -> tuple:
+    """Send one request() through a stub transport, returning the result and the attempts"""
+    attempts = []
+
+    def counting_handler(request):
+        attempts.append(request)
+        return handler(len(attempts))
+
+    async def run():
+        _reset()
+        http_client._client = httpx.AsyncClient(transport=httpx.MockTransport(counting_handler))
+        try:
+            return await http_client.request(service, "GET", "https://vendor.example/api")
+        finally:
+            await http_client.close_http_client()
+
+    with mock.patch.object(rate_limit, "RETRY_BASE_DELAY", 0.01):
+        try:
+            return asyncio.run(run()), len(attempts)
+        except Exception as e:
+            return e, len(attempts)
+
+def test_request_retries_429():
+    def handler(attempt):
+        if attempt < 3:
+            return httpx.Response(429, headers={"Retry-After": "0"})
+        return httpx.Response(200, json={"ok": True})
+
+    response, attempts = _request_with(handler)
+    assert response.status_code == 200
+    assert attempts == 3
+
+    response, attempts = _request_with(lambda attempt: httpx.Response(429, headers={"Retry-After": "3600"}))
+    assert response.status_code == 429
+    assert attempts == 1
+
+    response, attempts = _request_with(lambda attempt: httpx.Response(429))
+    assert response.status_code == 429
+    assert attempts == rate_limit.RETRY_MAX_ATTEMPTS
+
+    print("[OK] request() retries 429s, honouring Retry-After, up to RETRY_MAX_ATTEMPTS")
+
+def test_request_retries_transport_errors():
+    def handler(attempt):
+        if attempt < 3:
+            raise httpx.ConnectError("connection refused")
+        return httpx.Response(200)
+
+    response, attempts = _request_with(handler)
+    assert response.status_code == 200
+    assert attempts == 3
+
+    def always_failing(attempt):
+        raise httpx.ConnectError("connection refused")
+
+    error, attempts = _request_with(always_failing)
+    assert isinstance(error, httpx.ConnectError)
+    assert attempts == rate_limit.RETRY_MAX_ATTEMPTS
+
+    print("[OK] request() retries transport errors and raises the last one")
+
+def test_request_does_not_retry_other_services():
+    response, attempts = _request_with(lambda attempt: httpx.Response(503), service="staging")
+    assert response.status_code == 503
+    assert attempts == 1
+
+    print("[OK] request() sends non-vendor requests once")
+
+def test_open_circuit_spends_no_token():
+    """A call rejected by an open circuit fails at once, without waiting for a token"""
+    async def run():
+        _reset()
+        breaker = circuit_breaker.get_circuit_breaker("posthog")
+        for _ in range(breaker.failure_threshold):
+            breaker.record_failure("HTTP 503")
+        await rate_limit.acquire_token("posthog")
+        rate_limit._buckets["posthog"].tokens = 0.5
+
+        start = time.monotonic()
+        try:
+            await http_client.request("posthog", "GET", "https://vendor.example/api")
+        except CircuitOpenError:
+            pass
+        else:
+            raise AssertionError("the request went through an open circuit")
+        assert time.monotonic() - start < 0.1
+        assert rate_limit._buckets["posthog"].tokens >= 0.5
+
+    asyncio.run(run())
+    print("[OK] Open circuit fails fast and spends no token")
+
+if __name__ == "__main__":
+    test_bucket_refill()
+    test_bucket_wait_time()
+    test_retry_after_seconds()
+    test_retry_after_http_date()
+    test_retry_after_over_max_delay()
+    test_backoff_without_retry_after()
+    test_request_retries_429()
+    test_request_retries_transport_errors()
+    test_request_does_not_retry_other_services()
+    test_open_circuit_spends_no_token()
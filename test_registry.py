@@ -0,0 +1,124 @@
+import os
+import subprocess
+import sys
+import tempfile
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Run in a separate process; each argument is 'product=stage' to update, 'flush',
+# 'reclaim' for the flusher's replay of crashed workers' journals, 'crash' to exit
+# without flushing, 'hold' to wait for a line on stdin, or 'show=product'
+WORKER = """
+import asyncio, os, sys
+from services.registry import update_stage_fields, get_stage, flush_stage_updates, _reclaim_orphaned_journals
+
+async def main():
+    for arg in sys.argv[1:]:
+        if arg == "crash":
+            sys.stdout.flush()
+            os._exit(1)
+        elif arg == "flush":
+            await flush_stage_updates()
+        elif arg == "reclaim":
+            await asyncio.to_thread(_reclaim_orphaned_journals)
+        elif arg == "hold":
+            print("ready", flush=True)
+            sys.stdin.readline()
+        elif arg.startswith("show="):
+            print((await get_stage(arg[5:])).get("stage"), flush=True)
+        else:
+            product_id, stage = arg.split("=")
+            await update_stage_fields(product_id, stage=stage)
+
+asyncio.run(main())
+"""
+
+def _env(workdir: str) -> dict:
+    env = dict(os.environ)
+    env["PYTHONPATH"] = REPO_DIR
+    env["REGISTRY_DB"] = os.path.join(workdir, "registry.db")
+    env.pop("REGISTRY_JOURNAL", None)
+    return env
+
+def _run(workdir: str, *args: str) -> subprocess.CompletedProcess:
+    return subprocess.run(
+        [sys.executable, "-c", WORKER, *args],
+        cwd=workdir, env=_env(workdir), capture_output=True, text=True, timeout=30
+    )
+
+def _journals(workdir: str) -> list:
+    return [name for name in os.listdir(workdir) if ".journal" in name]
+
+def test_replay_after_crash():
+    """An acknowledged update survives a crash before the flush"""
+    with tempfile.TemporaryDirectory() as workdir:
+        crashed = _run(workdir, "chorus=Beta", "crash")
+        assert crashed.returncode == 1, crashed.stderr
+        assert _journals(workdir), "the crashed worker left no journal"
+
+        restarted = _run(workdir, "show=chorus")
+        assert restarted.returncode == 0, restarted.stderr
+        assert restarted.stdout.strip().splitlines()[-1] == "Beta"
+        assert not _journals(workdir), "the replayed journal was not deleted"
+
+        print("[OK] Update journaled before a crash is replayed on restart")
+
+def _start(workdir: str, *args: str) -> subprocess.Popen:
+    worker = subprocess.Popen(
+        [sys.executable, "-c", WORKER, *args],
+        cwd=workdir, env=_env(workdir), stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True
+    )
+    # Skip what the worker prints while creating the database
+    for line in worker.stdout:
+        if line.strip() == "ready":
+            break
+    return worker
+
+def test_flush_keeps_other_workers_updates():
+    """A worker flushing leaves the unflushed updates of a live worker alone"""
+    with tempfile.TemporaryDirectory() as workdir:
+        flushing = _start(workdir, "kenna=GA", "hold", "flush")
+        live = _start(workdir, "cadence=Alpha", "hold", "crash")
+        try:
+            flushing.communicate("\n", timeout=30)
+            assert flushing.returncode == 0
+
+            # The live worker dies without flushing
+            live.communicate("\n", timeout=30)
+        finally:
+            for worker in (flushing, live):
+                if worker.poll() is None:
+                    worker.kill()
+
+        restarted = _run(workdir, "show=cadence", "show=kenna")
+        assert restarted.returncode == 0, restarted.stderr
+        assert restarted.stdout.strip().splitlines()[-2:] == ["Alpha", "GA"]
+
+        print("[OK] Updates of a live worker survive another worker's flush and are replayed after it dies")
+
+def test_replay_keeps_newer_updates():
+    """A crashed worker's journal replayed late does not overwrite a newer update"""
+    with tempfile.TemporaryDirectory() as workdir:
+        live = _start(workdir, "show=chorus", "hold", "chorus=GA", "flush", "reclaim", "show=chorus")
+        try:
+            # Written before the live worker's update, then lost with the crash
+            crashed = _run(workdir, "chorus=Beta", "crash")
+            assert crashed.returncode == 1, crashed.stderr
+
+            out, _ = live.communicate("\n", timeout=30)
+            assert live.returncode == 0
+            assert "Replayed 1 journaled stage updates" in out
+            assert out.strip().splitlines()[-1] == "GA"
+        finally:
+            if live.poll() is None:
+                live.kill()
+
+        restarted = _run(workdir, "show=chorus")
+        assert restarted.stdout.strip().splitlines()[-1] == "GA"
+
+        print("[OK] Late replay of a crashed worker's journal keeps the newer update")
+
+if __name__ == "__main__":
+    test_replay_after_crash()
+    test_flush_keeps_other_workers_updates()
+    test_replay_keeps_newer_updates()